@@ -1,12 +1,580 @@
-import json
+import asyncio
+import calendar
+import contextlib
 import datetime
+import logging
+import math
+import os
+import pickle
+import queue
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
 from influxdb import InfluxDBClient
 import paho.mqtt.client as mqtt
+from OpenCEM.cem_lib_metrics import metrics
+from OpenCEM.cem_lib_publishing import decode_payload
+
+logger = logging.getLogger(__name__)
+
+
+class WriteSpool:
+    """
+    Append-only spool on disk (SQLite) for batches that could not be written to InfluxDB.
+    The batches are kept in order and replayed oldest first. If the spool exceeds max_bytes,
+    the oldest batches are evicted.
+    """
+
+    def __init__(self, path, max_bytes=100 * 1024 * 1024):
+        """
+        Args:
+            path (str): SQLite file of the spool.
+            max_bytes (int): Maximum size of the spooled lines in bytes.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # used by the logger thread and the MQTT thread, access is serialized by the lock
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS spool ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, database TEXT NOT NULL, lines TEXT NOT NULL, "
+            "points INTEGER NOT NULL, bytes INTEGER NOT NULL)"
+        )
+        self.connection.commit()
+        self.points, self.bytes = self.connection.execute(
+            "SELECT COALESCE(SUM(points), 0), COALESCE(SUM(bytes), 0) FROM spool"
+        ).fetchone()
+        if self.points:
+            logger.info("InfluxDB spool loaded: path=%s points=%d bytes=%d", path, self.points, self.bytes)
+        self._update_metrics()
+
+    def __len__(self):
+        return self.points
+
+    def append(self, database, lines):
+        """
+        Appends a batch and evicts the oldest batches if the spool is full.
+
+        Args:
+            database (str): Target database.
+            lines (list): Lines in the line protocol.
+        """
+        text = "\n".join(lines)
+        size = len(text.encode())
+        with self._lock:
+            self.connection.execute(
+                "INSERT INTO spool (database, lines, points, bytes) VALUES (?, ?, ?, ?)",
+                (database, text, len(lines), size),
+            )
+            self.points += len(lines)
+            self.bytes += size
+            evicted = 0
+            while self.bytes > self.max_bytes:
+                row = self.connection.execute("SELECT id, points, bytes FROM spool ORDER BY id LIMIT 1").fetchone()
+                if row is None:
+                    break
+                self.connection.execute("DELETE FROM spool WHERE id = ?", (row[0],))
+                self.points -= row[1]
+                self.bytes -= row[2]
+                evicted += row[1]
+            self.connection.commit()
+            if evicted:
+                self.connection.execute("PRAGMA incremental_vacuum")
+        if evicted:
+            metrics.increment("opencem_influx_spool_evicted_total", evicted)
+            logger.warning("InfluxDB spool full, oldest points evicted: points=%d", evicted)
+        self._update_metrics()
+
+    def peek(self):
+        """
+        Returns:
+            tuple: (id, database, lines) of the oldest batch, None if the spool is empty.
+        """
+        with self._lock:
+            row = self.connection.execute("SELECT id, database, lines FROM spool ORDER BY id LIMIT 1").fetchone()
+        if row is None:
+            return None
+        return row[0], row[1], row[2].split("\n")
+
+    def remove(self, batch_id):
+        with self._lock:
+            row = self.connection.execute("SELECT points, bytes FROM spool WHERE id = ?", (batch_id,)).fetchone()
+            if row is None:
+                return
+            self.connection.execute("DELETE FROM spool WHERE id = ?", (batch_id,))
+            self.connection.commit()
+            self.points -= row[0]
+            self.bytes -= row[1]
+            if not self.points:
+                self.connection.execute("PRAGMA incremental_vacuum")
+        self._update_metrics()
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+    def _update_metrics(self):
+        metrics.set_gauge("opencem_influx_spool_points", self.points)
+        metrics.set_gauge("opencem_influx_spool_bytes", self.bytes)
+
+
+class BatchWriter:
+    """
+    Collects line protocol points across datapoints, devices and snapshots
+    and writes them with one request per database.
+    The points are flushed if batch_size points are collected or the oldest point waited flush_interval seconds.
+    Batches that fail are kept in the spool and replayed at replay_rate points per second once InfluxDB is back.
+    """
+
+    def __init__(self, influx_client, batch_size=5000, flush_interval=10.0, spool: WriteSpool = None, replay_rate=5000):
+        """
+        Args:
+            influx_client (InfluxDBClient): Client used for the writes.
+            batch_size (int): Number of points that triggers a flush.
+            flush_interval (float): Maximum time in seconds a point is kept before it is written.
+            spool (WriteSpool): Spool for failed batches, None = failed batches are dropped.
+            replay_rate (float): Maximum spooled points replayed per second.
+        """
+        self.influx_client = influx_client
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.spool = spool
+        self.replay_rate = max(1, replay_rate)
+        self._lock = threading.Lock()
+        self.batches = {}  # database -> list of lines
+        self.point_count = 0
+        self.first_point_time = None  # monotonic time of the oldest point
+        self.databases = set()  # databases known to exist
+        self.influx_available = True  # result of the last write
+        self.next_replay = 0.0  # monotonic time of the next replay
+
+    def add(self, database, points):
+        """
+        Adds points and flushes if the size threshold is reached.
+
+        Args:
+            database (str): Target database.
+            points (list): Lines in the line protocol with millisecond timestamps.
+        """
+        with self._lock:
+            self.batches.setdefault(database, []).extend(points)
+            self.point_count += len(points)
+            if self.first_point_time is None:
+                self.first_point_time = time.monotonic()
+            full = self.point_count >= self.batch_size
+        if full:
+            self.flush()
+
+    def time_to_flush(self):
+        """
+        Returns:
+            float: Seconds until the collected points are due, None if there are no points.
+        """
+        with self._lock:
+            if self.first_point_time is None:
+                return None
+            return max(0.0, self.first_point_time + self.flush_interval - time.monotonic())
+
+    def flush_if_due(self):
+        remaining = self.time_to_flush()
+        if remaining is not None and remaining <= 0:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes all collected points, one request per database.
+        """
+        with self._lock:
+            batches = self.batches
+            self.batches = {}
+            self.point_count = 0
+            self.first_point_time = None
+
+        for database, points in batches.items():
+            if not self._write(database, points):
+                if self.spool is not None:
+                    self.spool.append(database, points)
+                    logger.warning("InfluxDB write failed, points spooled: database=%s points=%d", database, len(points))
+                else:
+                    logger.error("InfluxDB write failed, points dropped: database=%s points=%d", database, len(points))
+
+    def replay(self):
+        """
+        Replays the oldest spooled batch if InfluxDB is available and the replay rate allows it.
+        """
+        if self.spool is None or not len(self.spool) or not self.influx_available:
+            return
+        now = time.monotonic()
+        if now < self.next_replay:
+            return
+        batch = self.spool.peek()
+        if batch is None:
+            return
+        batch_id, database, points = batch
+        if self._write(database, points):
+            self.spool.remove(batch_id)
+            metrics.increment("opencem_influx_spool_replayed_total", len(points))
+            logger.debug("InfluxDB spool replayed: database=%s points=%d remaining=%d", database, len(points), len(self.spool))
+        self.next_replay = now + len(points) / self.replay_rate
+
+    def time_to_replay(self):
+        """
+        Returns:
+            float: Seconds until the next replay, None if nothing can be replayed.
+        """
+        if self.spool is None or not len(self.spool) or not self.influx_available:
+            return None
+        return max(0.0, self.next_replay - time.monotonic())
+
+    def _write(self, database, points):
+        # returns True if the points were written
+        start = time.perf_counter()
+        try:
+            if database not in self.databases:
+                self.influx_client.create_database(database)  # no-op if the database exists
+                self.databases.add(database)
+            self.influx_client.write_points(points, database=database, time_precision="ms", protocol="line")
+        except Exception as e:
+            metrics.increment("opencem_influx_write_errors_total", database=database)
+            if self.influx_available:
+                logger.error("InfluxDB not available: database=%s error=%s", database, e)
+            self.influx_available = False
+            return False
+        if not self.influx_available:
+            logger.info("InfluxDB available again")
+        self.influx_available = True
+        metrics.observe("opencem_influx_batch_points", len(points))
+        metrics.observe("opencem_influx_flush_seconds", time.perf_counter() - start)
+        logger.debug("InfluxDB batch written: database=%s points=%d", database, len(points))
+        return True
+
+
+class InfluxSchema:
+    """
+    Layout of the logged values in InfluxDB, used by the logger and the GUI.
+    - "per_device": one database device_<name> per device, one measurement <fp>_<dp> per datapoint,
+      fields value, unit and error_code
+    - "tagged": one database for the installation, one measurement with the tags device, fp, dp and unit
+      and the fields value and error_code. Whole-installation queries are single statements.
+    Timestamps:
+    - "local": the local wall time is stored as if it were UTC, as by OpenCEM before version 2.1
+    - "utc": the real UTC epoch is stored, the GUI shows it in local time
+    On a host running in UTC (e.g. the Docker image without TZ) both are the same.
+    """
+
+    SCHEMAS = ("per_device", "tagged")
+    TIMESTAMPS = ("local", "utc")
+
+    def __init__(self, schema="per_device", database="openCEM", measurement="datapoint", timestamps="local"):
+        """
+        Args:
+            schema (str): "per_device" or "tagged".
+            database (str): Database of the tagged schema.
+            measurement (str): Measurement of the tagged schema.
+            timestamps (str): "local" or "utc".
+        """
+        if schema not in self.SCHEMAS:
+            raise ValueError(f"Unknown InfluxDB schema '{schema}', use one of {self.SCHEMAS}")
+        if timestamps not in self.TIMESTAMPS:
+            raise ValueError(f"Unknown InfluxDB timestamps '{timestamps}', use one of {self.TIMESTAMPS}")
+        self.schema = schema
+        self.database = database
+        self.measurement = measurement
+        self.timestamps = timestamps
+        self.line_series = {}  # (device, fp, dp, unit) -> escaped line protocol parts of the series
+
+    @property
+    def tagged(self):
+        return self.schema == "tagged"
+
+    def database_for(self, device_name):
+        return self.database if self.tagged else f"device_{device_name}"
+
+    def to_influx_ms(self, timestamp_ms):
+        """
+        Converts epoch milliseconds to the time stored in InfluxDB.
+
+        Args:
+            timestamp_ms (int): Epoch milliseconds (UTC).
+
+        Returns:
+            int: Epoch milliseconds, shifted by the local UTC offset for "local" timestamps.
+        """
+        if self.timestamps == "utc":
+            return timestamp_ms
+        return timestamp_ms + time.localtime(timestamp_ms // 1000).tm_gmtoff * 1000
+
+    def now_ms(self):
+        # current time as stored in InfluxDB, InfluxQL now() is always UTC
+        return self.to_influx_ms(time.time_ns() // 1_000_000)
+
+    def parse_legacy_timestamp(self, timestamp):
+        """
+        Converts the local time string of payload version 1 to the time stored in InfluxDB.
+
+        Args:
+            timestamp (str): Format '%d/%m/%Y, %H:%M:%S'.
+
+        Returns:
+            int: Epoch milliseconds.
+        """
+        dt = datetime.datetime.strptime(timestamp, "%d/%m/%Y, %H:%M:%S")
+        if self.timestamps == "utc":
+            return int(time.mktime(dt.timetuple())) * 1000
+        return calendar.timegm(dt.timetuple()) * 1000
+
+    def to_datetime(self, influx_ms):
+        """
+        Converts a time read from InfluxDB for display.
+
+        Args:
+            influx_ms (int): Epoch milliseconds as stored.
+
+        Returns:
+            datetime.datetime: Naive local wall time.
+        """
+        if self.timestamps == "utc":
+            return datetime.datetime.fromtimestamp(influx_ms / 1000)
+        # the stored time already is the local wall time
+        return datetime.datetime.fromtimestamp(influx_ms / 1000, datetime.timezone.utc).replace(tzinfo=None)
+
+    def make_point(self, device_name, dp, time_value):
+        """
+        Builds the point of a datapoint.
+
+        Args:
+            device_name (str): Name of the device.
+            dp (dict): Datapoint with keys 'fp', 'dp', 'value', 'unit', 'error_code'.
+            time_value: Time of the snapshot, epoch or datetime.
+
+        Returns:
+            dict: Point in the format of InfluxDBClient.write_points.
+        """
+        try:
+            value = float(dp["value"])
+        except (ValueError, TypeError):
+            value = 0.0
+        if self.tagged:
+            return {
+                "measurement": self.measurement,
+                "tags": {"device": device_name, "fp": dp["fp"], "dp": dp["dp"], "unit": dp["unit"]},
+                "time": time_value,
+                "fields": {"value": value, "error_code": dp.get("error_code", 0)},
+            }
+        return {
+            "measurement": f"{dp['fp']}_{dp['dp']}",
+            "time": time_value,
+            "fields": {"value": value, "unit": dp["unit"], "error_code": dp.get("error_code", 0)},
+        }
+
+    def make_line(self, device_name, dp, timestamp_ms):
+        """
+        Serializes a datapoint to the line protocol. The escaped series parts are built once per series.
+        The fields are the same as in make_point.
+
+        Args:
+            device_name (str): Name of the device.
+            dp (dict): Datapoint with keys 'fp', 'dp', 'value', 'unit', 'error_code'.
+            timestamp_ms (int): Epoch milliseconds of the snapshot.
+
+        Returns:
+            str: Line, None if the value is not finite.
+        """
+        key = (device_name, dp["fp"], dp["dp"], dp["unit"])
+        series = self.line_series.get(key)
+        if series is None:
+            series = self.line_series[key] = self._line_series(*key)
+        try:
+            value = float(dp["value"])
+        except (ValueError, TypeError):
+            value = 0.0
+        if not math.isfinite(value):
+            return None
+        head, middle = series
+        return f"{head}{int(dp.get('error_code', 0))}i{middle}{value!r} {timestamp_ms}"
+
+    def _line_series(self, device_name, fp, dp, unit):
+        # line = head + error_code + "i" + middle + value + " " + timestamp, fields sorted like the influxdb client
+        if self.tagged:
+            tags = {"device": device_name, "dp": dp, "fp": fp, "unit": unit}
+            head = escape_tag(self.measurement) + "".join(
+                f",{name}={escape_tag(value)}" for name, value in tags.items() if value != ""
+            )
+            return f"{head} error_code=", ",value="
+        return f"{escape_tag(f'{fp}_{dp}')} error_code=", f",unit={quote_string(unit)},value="
+
+    def devices(self, client):
+        """
+        Returns:
+            list: Names of the devices with logged values.
+        """
+        if self.tagged:
+            result = client.query(
+                f'SHOW TAG VALUES FROM {quote_ident(self.measurement)} WITH KEY = "device"',
+                database=self.database,
+            )
+            return [point["value"] for point in result.get_points()]
+        return [
+            db["name"][len("device_"):] for db in client.get_list_database() if db["name"].startswith("device_")
+        ]
+
+    def series(self, client, device_name):
+        """
+        Returns:
+            list: Logged datapoints of the device as dicts with keys 'key' (see select), 'label' and 'unit'.
+        """
+        if self.tagged:
+            result = client.query(
+                f'SHOW SERIES FROM {quote_ident(self.measurement)} WHERE "device" = $device',
+                bind_params={"device": device_name},
+                database=self.database,
+            )
+            series = {}
+            for point in result.get_points():
+                tags = parse_series_key(point["key"])
+                key = (tags.get("fp", ""), tags.get("dp", ""))
+                series[key] = {"key": key, "label": f"{key[0]} - {key[1]}", "unit": tags.get("unit", "")}
+            return [series[key] for key in sorted(series)]
+        result = client.query("SHOW MEASUREMENTS", database=self.database_for(device_name))
+        return [
+            {"key": point["name"], "label": point["name"].replace("_", " - ", 1), "unit": ""}
+            for point in result.get_points()
+        ]
+
+    def key(self, fp, dp):
+        # key of a datapoint as used by series and demux
+        return (fp, dp) if self.tagged else f"{fp}_{dp}"
+
+    def label(self, key):
+        # readable name of a datapoint key
+        return f"{key[0]} - {key[1]}" if self.tagged else key.replace("_", " - ", 1)
+
+    def select_devices(self, device_names, where="time > now() - 1h", bucket=None):
+        """
+        Builds one request for the values of all datapoints of the devices.
+        Tagged schema: one statement grouped by device, fp and dp.
+        Per-device schema: one statement per device database with a regex over all measurements.
+        With a bucket the values are downsampled by InfluxDB to the mean, min, max and count per time bucket.
+
+        Args:
+            device_names (list): Names of the devices.
+            where (str): Time condition.
+            bucket (int): Length of the time buckets in seconds, None = raw values.
+
+        Returns:
+            tuple: (database, query, bind_params), see demux for the result
+        """
+        if bucket:
+            fields = 'mean("value") AS "value", min("value") AS "min", max("value") AS "max", count("value") AS "count"'
+            group_by = f"time({int(bucket)}s), "
+            fill = " fill(none)"
+        else:
+            fields, group_by, fill = '"value", "unit"', "", ""
+        if self.tagged:
+            devices = " OR ".join(f'"device" = $device{i}' for i in range(len(device_names)))
+            # unit is a tag, it is returned by the group
+            query = (
+                f"SELECT {fields} FROM {quote_ident(self.measurement)} WHERE ({devices}) AND {where} "
+                f'GROUP BY {group_by}"device", "fp", "dp", "unit"{fill} ORDER BY time ASC'
+            )
+            return self.database, query, {f"device{i}": name for i, name in enumerate(device_names)}
+        if bucket:
+            fields += ', last("unit") AS "unit"'
+            group_by = f" GROUP BY time({int(bucket)}s)"
+        else:
+            fields = "*"
+        query = "; ".join(
+            f"SELECT {fields} FROM {quote_ident(self.database_for(name))}../.*/ WHERE {where}{group_by}{fill} ORDER BY time ASC"
+            for name in device_names
+        )
+        return None, query, None
+
+    def demux(self, result, device_names):
+        """
+        Splits the result of select_devices into the datapoints.
+
+        Args:
+            result: ResultSet or list of ResultSets of InfluxDBClient.query.
+            device_names (list): Names of the devices as passed to select_devices.
+
+        Returns:
+            dict: device name -> datapoint key -> list of points
+        """
+        results = result if isinstance(result, list) else [result]
+        data = {name: {} for name in device_names}
+        if self.tagged:
+            for (_, tags), points in results[0].items():
+                if tags and tags.get("device") in data:
+                    unit = tags.get("unit", "")
+                    points = [{**p, "unit": unit} for p in points]
+                    # a datapoint with a changed unit has several series
+                    key = (tags.get("fp", ""), tags.get("dp", ""))
+                    series = data[tags["device"]].setdefault(key, [])
+                    series.extend(points)
+                    if len(series) > len(points):
+                        series.sort(key=lambda p: p["time"])
+            return data
+        for name, device_result in zip(device_names, results):
+            for (measurement, _), points in device_result.items():
+                data[name][measurement] = list(points)
+        return data
+
+
+def quote_ident(name):
+    # InfluxQL identifier in double quotes
+    return '"' + str(name).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def escape_tag(name):
+    # measurement names, tag keys and tag values in the line protocol
+    return (
+        str(name).replace("\\", "\\\\").replace(" ", "\\ ").replace(",", "\\,").replace("=", "\\=").replace("\n", "\\n")
+    )
+
+
+def quote_string(value):
+    # string field values in the line protocol
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+
+
+def parse_series_key(key):
+    """
+    Parses a series key of SHOW SERIES, e.g. 'datapoint,device=meter,dp=ActivePowerAC,fp=ActivePower,unit=W'.
+
+    Returns:
+        dict: Tags of the series.
+    """
+    tags = {}
+    parts = []
+    current = ""
+    escaped = False
+    for char in key:
+        if escaped:
+            current += char
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == ",":
+            parts.append(current)
+            current = ""
+        else:
+            current += char
+    parts.append(current)
+    for part in parts[1:]:
+        name, _, value = part.partition("=")
+        tags[name] = value
+    return tags
 
 
 class InfluxDataLogger:
     """
-    Logger class for receiving device data via MQTT and storing it in InfluxDB.
+    Logger class for receiving device data and storing it in InfluxDB.
+    Within OpenCEM the snapshots are received from the calculation loop via a queue (see also LoggerProcess),
+    standalone the logger subscribes to the MQTT topic.
     """
 
     def __init__(
@@ -18,6 +586,15 @@ class InfluxDataLogger:
         mqtt_broker="localhost",
         mqtt_port=1883,
         mqtt_topic="openCEM/value",
+        snapshot_queue: queue.Queue = None,
+        batch_size=5000,
+        flush_interval=10.0,
+        schema: InfluxSchema = None,
+        spool_path=None,
+        spool_max_bytes=100 * 1024 * 1024,
+        replay_rate=5000,
+        stop_event=None,
+        influx_timeout=10.0,
     ):
         """
         Initialize the logger.
@@ -28,10 +605,24 @@ class InfluxDataLogger:
             mqtt_broker (str): Hostname of the MQTT broker.
             mqtt_port (int): Port of the MQTT broker.
             mqtt_topic (str): MQTT topic to subscribe to for device data.
+            snapshot_queue (queue.Queue): Queue with the snapshots of the calculation loop.
+                If set, MQTT is not used.
+            batch_size (int): Number of points that triggers a write to InfluxDB.
+            flush_interval (float): Maximum time in seconds points are kept before they are written.
+            schema (InfluxSchema): Layout of the values in InfluxDB, defaults to one database per device.
+            spool_path (str): SQLite file for points that could not be written, None = points are dropped.
+            spool_max_bytes (int): Maximum size of the spooled points, the oldest are evicted.
+            replay_rate (float): Maximum spooled points replayed per second once InfluxDB is back.
+            stop_event: Event that stops the logging, defaults to a new threading.Event.
+            influx_timeout (float): Timeout per InfluxDB request in seconds, None = wait forever.
         """
-        # initialize InfluxDB client
-        self.influx_client = InfluxDBClient(influx_host, influx_port, username=influx_user, password=influx_password)
-        self.device_databases = {}
+        # initialize InfluxDB client, a hanging request must not stop the logging
+        self.influx_client = InfluxDBClient(
+            influx_host, influx_port, username=influx_user, password=influx_password, timeout=influx_timeout
+        )
+        self.schema = schema or InfluxSchema()
+        self.spool = WriteSpool(spool_path, spool_max_bytes) if spool_path else None
+        self.batch_writer = BatchWriter(self.influx_client, batch_size, flush_interval, self.spool, replay_rate)
 
         # Initialize MQTT client and connection parameters
         self.mqtt_client = mqtt.Client()
@@ -39,6 +630,10 @@ class InfluxDataLogger:
         self.mqtt_port = mqtt_port
         self.mqtt_topic = mqtt_topic
 
+        self.snapshot_queue = snapshot_queue
+        self._stop_event = stop_event or threading.Event()
+        self.snapshot_count = 0
+
     def _on_mqtt_connect(self, client, userdata, flags, rc):
         """
         Callback for MQTT connection.
@@ -55,50 +650,28 @@ class InfluxDataLogger:
         Process and store device data in InfluxDB.
 
         Args:
-            data (dict): Dictionary with keys 'timestamp' and 'devices_list'.
-                - timestamp (str): Format '%d/%m/%Y, %H:%M:%S'
+            data (dict): Dictionary with keys 'timestamp_ms' and 'devices_list'.
+                - timestamp_ms (int): Epoch milliseconds (payload version 2)
+                - timestamp (str): Format '%d/%m/%Y, %H:%M:%S', used if 'timestamp_ms' is missing
                 - devices_list (list): List of device dicts, each with:
                     - name (str)
-                    - datapoints (list of dicts with keys 'fp', 'dp', 'value', 'unit', 'error_code')
+                    - datapoints (list of dicts with keys 'fp', 'dp', 'value', 'unit', 'error_code',
+                      optional 'fresh': False if the value was not read in this tick, not logged)
         """
-        timestamp = data.get("timestamp")
         devices_list = data.get("devices_list", [])
 
-        dt = datetime.datetime.strptime(timestamp, "%d/%m/%Y, %H:%M:%S")
+        if "timestamp_ms" in data:
+            timestamp_ms = self.schema.to_influx_ms(data["timestamp_ms"])
+        else:
+            timestamp_ms = self.schema.parse_legacy_timestamp(data.get("timestamp"))
 
         for device in devices_list:
             device_name = device["name"]
-            db_name = f"device_{device_name}"
-
-            # Ensure database exists
-            if db_name not in self.device_databases:
-                existing_db = [
-                    db["name"] for db in self.influx_client.get_list_database()
-                ]
-                if db_name not in existing_db:
-                    self.influx_client.create_database(db_name)
-                self.device_databases[db_name] = True
-
-            for dp in device.get("datapoints", []):
-                measurement_name = f"{dp['fp']}_{dp['dp']}"
-                try:
-                    value = float(dp["value"])
-                except (ValueError, TypeError):
-                    value = 0.0
-
-                datapoint = [
-                    {
-                        "measurement": measurement_name,
-                        "time": dt,
-                        "fields": {
-                            "value": value,
-                            "unit": dp["unit"],
-                            "error_code": dp.get("error_code", 0),
-                        },
-                    }
-                ]
-
-                self.influx_client.write_points(datapoint, database=db_name)
+            db_name = self.schema.database_for(device_name)
+            make_line = self.schema.make_line
+            # only the datapoints read in this tick, values of slower datapoints are logged at their own interval
+            lines = [make_line(device_name, dp, timestamp_ms) for dp in device.get("datapoints", []) if dp.get("fresh", True)]
+            self.batch_writer.add(db_name, [line for line in lines if line is not None])
 
     def _on_mqtt_message(self, client, userdata, msg):
         """
@@ -109,26 +682,273 @@ class InfluxDataLogger:
             msg: MQTT message object.
         """
         try:
-            data = json.loads(msg.payload.decode())
-            print("Received data:")
+            data = decode_payload(msg.payload)
+            logger.debug("Received data: topic=%s bytes=%d", msg.topic, len(msg.payload))
             self._process_device_data(data)
+            self.snapshot_count += 1
         except Exception as e:
-            print(f"Error: {e}")
+            logger.error("Error logging data: %s", e)
 
     def start_logging(self):
         """
-        Start the MQTT client and begin logging data to InfluxDB.
+        Begin logging data to InfluxDB. Blocks until stop_logging is called.
 
         """
+        if self.snapshot_queue is not None:
+            self._consume_queue()
+            return
+
         self.mqtt_client.on_connect = self._on_mqtt_connect
         self.mqtt_client.on_message = self._on_mqtt_message
         self.mqtt_client.connect(self.mqtt_broker, self.mqtt_port, 60)
-        self.mqtt_client.loop_forever()
+        self.mqtt_client.loop_start()
+        # messages are handled by the MQTT thread, flush the batches on time here
+        while not self._stop_event.wait(self._flush_wait()):
+            self._write_due()
+        self._write_remaining()
+
+    def _consume_queue(self):
+        """
+        Stores the snapshots of the in-process queue until stop_logging is called.
+
+        """
+        while not self._stop_event.is_set():
+            try:
+                data = self.snapshot_queue.get(timeout=self._flush_wait())
+            except queue.Empty:
+                self._write_due()
+                continue
+            try:
+                self._process_device_data(data)
+                self.snapshot_count += 1
+            except Exception as e:
+                logger.error("Error logging data: %s", e)
+            self._write_due()
+        self._write_remaining()
+
+    def health(self):
+        """
+        Returns:
+            dict: State of the logger, reported to the main process in process mode.
+        """
+        return {
+            "snapshots": self.snapshot_count,
+            "influx_available": self.batch_writer.influx_available,
+            "pending_points": self.batch_writer.point_count,
+            "spool_points": len(self.spool) if self.spool is not None else 0,
+        }
+
+    def _write_due(self):
+        self.batch_writer.flush_if_due()
+        self.batch_writer.replay()
+
+    def _write_remaining(self):
+        # points that cannot be written stay in the spool for the next start
+        self.batch_writer.flush()
+        if self.spool is not None:
+            self.spool.close()
+
+    def _flush_wait(self):
+        # wait until the next flush or replay is due, but at most 1 s to check the stop event
+        waits = [1.0, self.batch_writer.time_to_flush(), self.batch_writer.time_to_replay()]
+        return max(0.01, min(wait for wait in waits if wait is not None))
 
     def stop_logging(self):
         """
-        Stop the MQTT client and disconnect.
+        Stop logging, disconnect the MQTT client if used.
+
+        """
+        self._stop_event.set()
+        if self.snapshot_queue is None:
+            self.mqtt_client.loop_stop()
+            self.mqtt_client.disconnect()
+
+
+class LoggerProcess:
+    """
+    Runs the InfluxDataLogger in a worker process, so that InfluxDB requests never delay the calculation loop.
+    The worker runs Data_Logger_worker.py, which only imports the data logger and not the script of the main
+    process (e.g. the GUI). Messages are pickled over the stdin and stdout of the worker:
+    - the settings, then ("snapshot", dict) for every snapshot and ("stop", None) to the worker
+    - ("ready", pid) after the logger was created
+    - ("health", dict) every health_interval seconds, see InfluxDataLogger.health,
+      with the metrics of the worker under "metrics"
+    - ("stopped", dict) after the remaining points were written or spooled
+    The worker is restarted if it dies or its health reports stop.
+    """
+
+    WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Data_Logger_worker.py")
+    MISSED_HEALTH_REPORTS = 3  # restart a worker that did not report for this many intervals
+
+    def __init__(self, logger_kwargs, queue_size=100, health_interval=10.0, log_level="INFO"):
+        """
+        Args:
+            logger_kwargs (dict): Arguments of InfluxDataLogger, must be picklable.
+            queue_size (int): Number of snapshots buffered for the worker.
+            health_interval (float): Seconds between the health reports of the worker.
+            log_level (str): Log level of the worker.
+        """
+        self.logger_kwargs = logger_kwargs
+        self.queue_size = max(1, queue_size)
+        self.health_interval = health_interval
+        self.log_level = log_level
+        self.snapshot_queue = queue.Queue(maxsize=self.queue_size)  # sent to the worker by the sender thread
+        self.status_queue = None
+        self.stopping = None  # set to send the remaining snapshots and ask the worker to stop
+        self.process = None
+        self.receiver = None
+        self.last_health = None  # last health report of the worker
+        self.last_health_time = None  # monotonic time of the last report
+
+    def start(self):
+        self.status_queue = queue.Queue()
+        self.stopping = threading.Event()
+        self.last_health_time = None
+        self.process = subprocess.Popen(
+            [sys.executable, self.WORKER_SCRIPT], stdin=subprocess.PIPE, stdout=subprocess.PIPE
+        )
+        settings = dict(
+            logger_kwargs=self.logger_kwargs,
+            queue_size=self.queue_size,
+            health_interval=self.health_interval,
+            log_level=self.log_level,
+        )
+        threading.Thread(
+            target=self._send_snapshots,
+            args=(self.process, settings, self.stopping),
+            name="OpenCEM-LoggerSender",
+            daemon=True,
+        ).start()
+        self.receiver = threading.Thread(
+            target=self._receive,
+            args=(self.process, self.status_queue),
+            name="OpenCEM-LoggerReceiver",
+            daemon=True,
+        )
+        self.receiver.start()
+        metrics.increment("opencem_logger_process_starts_total")
 
+    def _send_snapshots(self, process, settings, stopping):
+        try:
+            pickle.dump(settings, process.stdin)
+            process.stdin.flush()
+            while True:
+                try:
+                    message = ("snapshot", self.snapshot_queue.get(timeout=1.0))
+                except queue.Empty:
+                    if process.poll() is not None:
+                        return
+                    if not stopping.is_set():
+                        continue
+                    message = ("stop", None)
+                pickle.dump(message, process.stdin)
+                process.stdin.flush()
+                if message[0] == "stop":
+                    return
+        except OSError:
+            pass  # the worker exited, the monitor restarts it
+        finally:
+            with contextlib.suppress(OSError):
+                process.stdin.close()
+
+    def _receive(self, process, status_queue):
+        try:
+            while True:
+                status_queue.put(pickle.load(process.stdout))
+        except (EOFError, OSError, pickle.UnpicklingError):
+            pass  # the worker exited
+        finally:
+            process.stdout.close()
+
+    async def wait_ready(self, timeout=30.0):
         """
-        self.mqtt_client.loop_stop()
-        self.mqtt_client.disconnect()
+        Waits for the ready message of the worker.
+
+        Returns:
+            bool: True if the worker is ready.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                message = await asyncio.to_thread(self.status_queue.get, True, 1.0)
+                break
+            except queue.Empty:
+                if self.process.poll() is not None:
+                    logger.error("Logger process exited before it was ready: exitcode=%s", self.process.returncode)
+                    return False
+                if time.monotonic() > deadline:
+                    logger.error("Logger process not ready: timeout=%ss", timeout)
+                    return False
+        self._handle(message)
+        return message[0] == "ready"
+
+    async def monitor(self):
+        """
+        Collects the health reports and restarts the worker if it died or stopped reporting. Runs until cancelled.
+        """
+        while True:
+            await asyncio.sleep(self.health_interval)
+            self.poll()
+            if self.process.poll() is not None:
+                logger.error("Logger process died, restarting: exitcode=%s", self.process.returncode)
+            elif (
+                self.last_health_time is not None
+                and time.monotonic() - self.last_health_time > self.MISSED_HEALTH_REPORTS * self.health_interval
+            ):
+                logger.error(
+                    "Logger process stopped reporting, restarting: last_report=%.0fs ago",
+                    time.monotonic() - self.last_health_time,
+                )
+                self.process.kill()
+                await asyncio.to_thread(self.process.wait)
+            else:
+                continue
+            metrics.set_gauge("opencem_logger_process_alive", 0)
+            self.start()
+            if not await self.wait_ready():
+                logger.error("Logger process restart failed, retrying: retry_interval=%ss", self.health_interval)
+
+    def poll(self):
+        # handle the messages of the worker without blocking
+        while True:
+            try:
+                message = self.status_queue.get_nowait()
+            except queue.Empty:
+                return
+            self._handle(message)
+
+    async def stop(self, timeout=10.0):
+        """
+        Sends the remaining snapshots, asks the worker to write the remaining points and waits for it to exit.
+        """
+        if self.process is None or self.process.poll() is not None:
+            return
+        self.stopping.set()
+        try:
+            await asyncio.to_thread(self.process.wait, timeout)
+        except subprocess.TimeoutExpired:
+            logger.warning("Logger process did not stop, terminating: timeout=%ss", timeout)
+            self.process.terminate()
+        await asyncio.to_thread(self.receiver.join, 1.0)  # the stopped message is read after the exit
+        self.poll()
+        metrics.set_gauge("opencem_logger_process_alive", 0)
+
+    def _handle(self, message):
+        kind, payload = message
+        self.last_health_time = time.monotonic()
+        if kind == "ready":
+            logger.info("Logger process ready: pid=%s", payload)
+            metrics.set_gauge("opencem_logger_process_alive", 1)
+            return
+        worker_metrics = payload.pop("metrics", None)
+        if worker_metrics:
+            # write metrics of the worker, e.g. InfluxDB batches and errors
+            metrics.merge(worker_metrics)
+        self.last_health = payload
+        metrics.set_gauge("opencem_logger_influx_available", int(payload["influx_available"]))
+        metrics.set_gauge("opencem_logger_snapshots", payload["snapshots"])
+        metrics.set_gauge("opencem_influx_spool_points", payload["spool_points"])
+        if kind == "stopped":
+            logger.info("Logger process stopped: %s", " ".join(f"{key}={value}" for key, value in payload.items()))
+        elif not payload["influx_available"]:
+            logger.warning("Logger process reports InfluxDB not available: spool_points=%d", payload["spool_points"])
@@ -0,0 +1,77 @@
+"""
+Entry point of the worker process of Data_Logger.LoggerProcess.
+
+The worker is started as its own script, so it only imports the data logger and not the script of the
+main process (e.g. the GUI, which would connect to MQTT and build its pages again).
+Messages are pickled over stdin and stdout, see LoggerProcess. Output of the worker goes to stderr.
+"""
+import logging
+import os
+import pickle
+import queue
+import sys
+import threading
+
+from Data_Logger import InfluxDataLogger
+from OpenCEM.cem_lib_metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    # stdout carries the messages to the main process, everything else that is printed goes to stderr
+    messages_out = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+    messages_in = sys.stdin.buffer
+
+    settings = pickle.load(messages_in)
+    logging.basicConfig(
+        level=getattr(logging, str(settings["log_level"]).upper(), logging.INFO),
+        format="time=%(asctime)s level=%(levelname)s logger=%(name)s msg=%(message)s",
+    )
+    snapshot_queue = queue.Queue(maxsize=max(1, settings["queue_size"]))
+    stop_event = threading.Event()
+    send_lock = threading.Lock()
+
+    def send(kind, payload):
+        with send_lock:
+            pickle.dump((kind, payload), messages_out)
+            messages_out.flush()
+
+    def receive():
+        # snapshots until the main process asks to stop or exits
+        try:
+            while True:
+                kind, payload = pickle.load(messages_in)
+                if kind == "stop":
+                    break
+                try:
+                    snapshot_queue.put_nowait(payload)
+                except queue.Full:
+                    snapshot_queue.get_nowait()  # drop the oldest snapshot
+                    snapshot_queue.put_nowait(payload)
+        except (EOFError, OSError):
+            logger.warning("Main process closed the connection, stopping")
+        stop_event.set()
+
+    def report_health():
+        try:
+            while not stop_event.wait(settings["health_interval"]):
+                send("health", {**data_logger.health(), "metrics": metrics.snapshot()})
+        except OSError:
+            stop_event.set()
+
+    data_logger = InfluxDataLogger(snapshot_queue=snapshot_queue, stop_event=stop_event, **settings["logger_kwargs"])
+    send("ready", os.getpid())
+    threading.Thread(target=receive, daemon=True).start()
+    threading.Thread(target=report_health, daemon=True).start()
+    data_logger.start_logging()
+    try:
+        send("stopped", {**data_logger.health(), "metrics": metrics.snapshot()})
+    except OSError:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,7 @@
 import json
+import collections
+import threading
+from array import array
 import aiohttp
 from nicegui import ui
 from sgr_commhandler.device_builder import DeviceBuilder
@@ -7,9 +10,11 @@ import os
 import plotly.graph_objects as go
 import asyncio
 from OpenCEM_main import main as OpenCEM_main
-from influxdb import InfluxDBClient
 import paho.mqtt.client as mqtt
 import config_helper
+from OpenCEM.cem_lib_publishing import decode_payload
+from Data_Logger import InfluxSchema
+from Influx_Client_Pool import InfluxClientPool
 
 
 # Load configuration from YAML file
@@ -28,6 +33,28 @@ influxDB_address = config_helper.get_setting('INFLUX_HOST', 'influxDB_address',
 influxDB_port = int(config_helper.get_setting('INFLUX_PORT', 'influxDB_port', settings=config, default_value=8086))
 influxDB_user = config_helper.get_setting('INFLUX_USER', 'influxDB_user', settings=config, default_value='')
 influxDB_password = config_helper.get_setting('INFLUX_PASSWORD', 'influxDB_password', settings=config, default_value='')
+influx_query_timeout = float(config_helper.get_setting('INFLUX_QUERY_TIMEOUT', 'influx_query_timeout', settings=config, default_value=10))
+influx_pool_size = int(config_helper.get_setting('INFLUX_POOL_SIZE', 'influx_pool_size', settings=config, default_value=4))
+live_plot_source = config_helper.get_setting('LIVE_PLOT_SOURCE', 'live_plot_source', settings=config, default_value='mqtt')
+live_buffer_size = int(config_helper.get_setting('LIVE_BUFFER_SIZE', 'live_buffer_size', settings=config, default_value=3600))
+loop_time = int(config_helper.get_setting('LOOP_TIME', 'loop_time', settings=config, default_value=60))
+simulation_speed = float(config_helper.get_setting('SIMULATION_SPEED', 'simulation_speed', settings=config, default_value=1.0))
+plot_max_points = int(config_helper.get_setting('PLOT_MAX_POINTS', 'plot_max_points', settings=config, default_value=1000))
+influx_schema = InfluxSchema(
+    config_helper.get_setting('INFLUX_SCHEMA', 'influx_schema', settings=config, default_value='per_device'),
+    config_helper.get_setting('INFLUX_DATABASE', 'influx_database', settings=config, default_value='openCEM'),
+    timestamps=config_helper.get_setting('INFLUX_TIMESTAMPS', 'influx_timestamps', settings=config, default_value='local'),
+)
+
+# persistent clients with keep-alive sessions, shared by all GUI functions
+influx_pool = InfluxClientPool(
+    influxDB_address,
+    influxDB_port,
+    influxDB_user,
+    influxDB_password,
+    size=influx_pool_size,
+    timeout=influx_query_timeout,
+)
 
 
 # --------------------------
@@ -37,6 +64,7 @@ opencem_task = None
 plot_timer = None
 live_plots_active = False
 plot_figures = {}
+plot_period = None  # seconds between logged points, set by create_plots
 LocalEID_container = None
 mqtt_container = None
 
@@ -70,13 +98,74 @@ def on_connect(client, userdata, flags, rc):
 
 def on_message(client, userdata, msg):
     global mqtt_container
-    mqtt_message = msg.payload.decode()
+    data = decode_payload(msg.payload)
+    # feed the live plots
+    append_live_samples(data)
+    mqtt_message = json.dumps(data)
     if mqtt_container is not None:
         mqtt_container.clear()
         with mqtt_container:
             ui.label(f"Received data: {mqtt_message}").classes("text-sm")
 
 
+class RingBuffer:
+    """
+    Newest samples of a datapoint from the MQTT stream, fixed size and backed by arrays.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = max(1, capacity)
+        self.times = array("d", bytes(8 * self.capacity))  # epoch ms
+        self.values = array("d", bytes(8 * self.capacity))
+        self.start = 0  # index of the oldest sample
+        self.count = 0
+
+    def append(self, timestamp_ms, value):
+        i = (self.start + self.count) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+        else:
+            self.start = (self.start + 1) % self.capacity  # overwrite the oldest sample
+        self.times[i] = timestamp_ms
+        self.values[i] = value
+
+    def since(self, timestamp_ms):
+        """Samples newer than timestamp_ms as points ordered by time"""
+        points = []
+        for n in range(self.count - 1, -1, -1):
+            i = (self.start + n) % self.capacity
+            if timestamp_ms is not None and self.times[i] <= timestamp_ms:
+                break
+            points.append({"time": int(self.times[i]), "value": self.values[i]})
+        points.reverse()
+        return points
+
+
+live_buffers = {}  # (device, datapoint key) -> RingBuffer, written by the MQTT thread
+live_buffers_lock = threading.Lock()
+
+
+def append_live_samples(data):
+    """Append the values of a message on openCEM/value to the ring buffers"""
+    timestamp_ms = data.get("timestamp_ms")
+    if timestamp_ms is None:
+        return  # messages of version 1 have no epoch timestamp
+    with live_buffers_lock:
+        for device_dict in data.get("devices_list", []):
+            for dp in device_dict.get("datapoints", []):
+                if not dp.get("fresh", True):
+                    continue  # not read in this tick, already in the buffer
+                try:
+                    value = float(dp["value"])
+                except (ValueError, TypeError):
+                    continue
+                key = (device_dict["name"], influx_schema.key(dp["fp"], dp["dp"]))
+                buffer = live_buffers.get(key)
+                if buffer is None:
+                    buffer = live_buffers[key] = RingBuffer(live_buffer_size)
+                buffer.append(influx_schema.to_influx_ms(timestamp_ms), value)
+
+
 client = mqtt.Client()
 client.on_connect = on_connect
 client.on_message = on_message
@@ -533,21 +622,187 @@ def get_device_list():
 # ----------------------------
 
 
+# bucket lengths in seconds for downsampled plots
+PLOT_BUCKETS = [1, 2, 5, 10, 15, 30, 60, 120, 300, 600, 900, 1800, 3600]
+
+
+def plot_bucket(hours, period=None, max_points=None):
+    """
+    Smallest bucket length in seconds that keeps a trace of the time window below max_points,
+    None if the raw points with one point per period already stay below max_points
+    """
+    max_points = max(1, max_points or plot_max_points)
+    if period and hours * 3600 / period <= max_points:
+        return None
+    seconds = hours * 3600 / max_points
+    return next((bucket for bucket in PLOT_BUCKETS if bucket >= seconds), PLOT_BUCKETS[-1])
+
+
+def logging_period():
+    """
+    Seconds between two logged points of the fastest datapoint, each datapoint is only logged when it is read.
+    Calculated from the polling intervals in config.yaml
+    """
+    try:
+        with open(os.path.join(config_path, "config.yaml"), "r") as file:
+            devices = (yaml.safe_load(file) or {}).get("devices") or []
+    except (OSError, yaml.YAMLError):
+        devices = []
+    intervals = set()
+    for device in devices:
+        device_interval = device.get("interval", loop_time)
+        intervals.update(dp.get("interval", device_interval) for dp in device.get("datapoints", []))
+    return min(intervals, default=loop_time) / simulation_speed
+
+
+# live updates between two full figure updates, the browser only receives the new points in between
+PLOT_FULL_UPDATE_INTERVAL = 60
+
+
+class TraceBuffer:
+    """
+    Points of a plot trace. Live updates only fetch the points after the last timestamp,
+    append them and trim the points that left the time window.
+    Downsampled points carry min and max, shown as a band behind the mean.
+    The points that were not sent to the browser yet are kept for an extend update, see refresh_plot.
+    """
+
+    def __init__(self, index, band=None):
+        self.index = index  # index of the trace in the figure
+        self.band = band  # indexes of the min and max traces, None = no band
+        self.times = collections.deque()  # epoch ms
+        self.x = collections.deque()  # datetimes for plotly, converted once
+        self.values = collections.deque()
+        self.mins = collections.deque()
+        self.maxs = collections.deque()
+        self.last_ts = None  # epoch ms of the newest point
+        self.last_count = 1  # samples in the newest bucket
+        self.stream_ts = None  # epoch ms of the newest sample taken from the MQTT stream
+        self.advanced = True  # the last live update changed the trace
+        self.pending = []  # (x, value, min, max) not sent to the browser yet
+        self.drop = 0  # points at the end that were sent but replaced since
+
+    def append(self, points):
+        # points with epoch ms times, ordered by time
+        changed = False
+        for p in points:
+            value, low, high = p["value"], p.get("min", p["value"]), p.get("max", p["value"])
+            if self.times and p["time"] == self.times[-1] and (value, low, high) == (self.values[-1], self.mins[-1], self.maxs[-1]):
+                continue  # the last bucket did not change
+            changed = True
+            if self.times and p["time"] <= self.times[-1]:
+                # the last bucket was not complete, replace it
+                self.times.pop()
+                self.x.pop()
+                self.values.pop()
+                self.mins.pop()
+                self.maxs.pop()
+                if self.pending:
+                    self.pending.pop()
+                else:
+                    self.drop += 1
+            x = influx_schema.to_datetime(p["time"])
+            self.last_count = p.get("count", 1)
+            self.times.append(p["time"])
+            self.x.append(x)
+            self.values.append(value)
+            self.mins.append(low)
+            self.maxs.append(high)
+            self.pending.append((x.isoformat(), value, low, high))
+        if changed:
+            self.last_ts = self.times[-1]
+        return changed
+
+    def fold(self, samples, bucket_ms):
+        """
+        Folds raw samples of the MQTT stream into the time buckets of the downsampled points,
+        aligned to the epoch like GROUP BY time() of InfluxDB
+        """
+        changed = False
+        for sample in samples:
+            value = sample["value"]
+            start = sample["time"] - sample["time"] % bucket_ms
+            if self.times and start == self.times[-1]:
+                count = self.last_count
+                point = {
+                    "time": start,
+                    "value": (self.values[-1] * count + value) / (count + 1),
+                    "min": min(self.mins[-1], value),
+                    "max": max(self.maxs[-1], value),
+                    "count": count + 1,
+                }
+            elif not self.times or start > self.times[-1]:
+                point = {"time": start, "value": value, "min": value, "max": value, "count": 1}
+            else:
+                continue  # older than the newest bucket
+            changed |= self.append([point])
+        return changed
+
+    def cap(self, max_points):
+        # keep the newest max_points points
+        trimmed = False
+        while len(self.times) > max_points:
+            self.times.popleft()
+            self.x.popleft()
+            self.values.popleft()
+            self.mins.popleft()
+            self.maxs.popleft()
+            trimmed = True
+        return trimmed
+
+    def trim(self, start_ms):
+        trimmed = False
+        while self.times and self.times[0] < start_ms:
+            self.times.popleft()
+            self.x.popleft()
+            self.values.popleft()
+            self.mins.popleft()
+            self.maxs.popleft()
+            trimmed = True
+        return trimmed
+
+    def take_extension(self):
+        """
+        Returns the changes since the last call as (trace index, points to drop at the end, x, y, length)
+        for the mean and the band traces, the length trims the points that left the time window.
+        """
+        if not self.pending:
+            return []
+        x, values, mins, maxs = (list(column) for column in zip(*self.pending))
+        extension = [(self.index, self.drop, x, values, len(self.times))]
+        if self.band:
+            extension.append((self.band[0], self.drop, x, mins, len(self.times)))
+            extension.append((self.band[1], self.drop, x, maxs, len(self.times)))
+        self.pending = []
+        self.drop = 0
+        return extension
+
+    def to_figure(self, fig):
+        self.pending = []
+        self.drop = 0
+        x = list(self.x)
+        fig.data[self.index].x = x
+        fig.data[self.index].y = list(self.values)
+        if self.band:
+            fig.data[self.band[0]].x = x
+            fig.data[self.band[0]].y = list(self.mins)
+            fig.data[self.band[1]].x = x
+            fig.data[self.band[1]].y = list(self.maxs)
+
+
+def query_devices(client, device_names, where, bucket=None):
+    """Query all datapoints of the devices in one request, returns device -> datapoint key -> points (epoch ms)"""
+    database, query, bind_params = influx_schema.select_devices(device_names, where, bucket)
+    result = client.query(query, bind_params=bind_params, database=database, epoch="ms", method="POST")
+    return influx_schema.demux(result, device_names)
+
+
 def load_available_devices(device_select):
     """Load devices that have data in InfluxDB"""
-    global influxDB_address, influxDB_port, influxDB_user, influxDB_password
     try:
-        client = InfluxDBClient(influxDB_address, influxDB_port, username=influxDB_user, password=influxDB_password)
-        databases = client.get_list_database()
-
-        device_names = []
-        for db in databases:
-            db_name = db["name"]
-            if db_name.startswith("device_"):
-                device_name = db_name.replace("device_", "")
-                device_names.append(device_name)
+        with influx_pool.client() as client:
+            device_names = influx_schema.devices(client)
 
-        client.close()
         device_select.options = device_names
         if device_names:
             device_select.value = device_names[0]
@@ -560,29 +815,29 @@ def load_available_devices(device_select):
 
 def create_plots(hours_input, plots_container):
     """Create plots once, then only update data"""
-    global plot_figures
-    global influxDB_address, influxDB_port, influxDB_user, influxDB_password
+    global plot_figures, plot_period
 
     if live_plots_active:
         ui.notify("Already running", type="warning")
         return
 
     try:
-        client = InfluxDBClient(influxDB_address, influxDB_port, username=influxDB_user, password=influxDB_password)
-        databases = client.get_list_database()
-        device_dbs = [
-            db["name"] for db in databases if db["name"].startswith("device_")
-        ]
+        hours = hours_input.value or 1
+        plot_period = logging_period()
+        with influx_pool.client() as client:
+            device_names = influx_schema.devices(client)
+            # all datapoints of all devices in one request, downsampled to plot_max_points per trace
+            if device_names:
+                data = query_devices(client, device_names, f"time > {influx_schema.now_ms() - int(hours) * 3600 * 1000}ms", plot_bucket(hours, plot_period))
 
         plots_container.clear()
         plot_figures.clear()
 
-        if not device_dbs:
+        if not device_names:
             with plots_container:
                 ui.label("No devices found").classes("text-center text-red-500")
             return
 
-        hours = hours_input.value or 1
         colors = ["blue", "red", "green", "orange", "purple", "brown", "pink"]
 
         with plots_container:
@@ -590,75 +845,68 @@ def create_plots(hours_input, plots_container):
                 "text-xl font-bold mb-4"
             )
 
-            for db_name in device_dbs:
-                device_name = db_name.replace("device_", "")
-                client.switch_database(db_name)
-
-                # Get measurements
-                measurements_query = client.query("SHOW MEASUREMENTS")
-                measurements = [
-                    list(point.values())[0] for point in measurements_query.get_points()
-                ]
-
-                if measurements:
-                    # Create figure once
-                    fig = go.Figure()
-
-                    for i, measurement in enumerate(measurements):
-                        try:
-                            # FIX: Correct InfluxDB time syntax
-                            query = f'SELECT * FROM "{measurement}" WHERE time > now() - {int(hours)}h ORDER BY time ASC'
-                            result = client.query(query)
-                            points = list(result.get_points())
-
-                            if points:
-                                times = [p["time"] for p in points]
-                                values = [p["value"] for p in points]
-                                unit = points[0].get("unit", "")
-
-                                trace_name = measurement.replace("_", " - ")
-                                if unit:
-                                    trace_name += f" [{unit}]"
-
-                                fig.add_trace(
-                                    go.Scatter(
-                                        x=times,
-                                        y=values,
-                                        mode="lines+markers",
-                                        name=trace_name,
-                                        line=dict(
-                                            width=2, color=colors[i % len(colors)]
-                                        ),
-                                        marker=dict(size=3),
-                                    )
-                                )
-                        except Exception as e:
-                            print(f"Error querying measurement {measurement}: {e}")
-                            continue
-
-                    if fig.data:
-                        fig.update_layout(
-                            title=f"Device: {device_name}",
-                            xaxis_title="Time",
-                            yaxis_title="Values",
-                            height=400,
-                            hovermode="x unified",
+            for device_name in device_names:
+                # Create figure once
+                fig = go.Figure()
+                traces = {}
+
+                for key, points in sorted(data[device_name].items()):
+                    if not points:
+                        continue
+                    color = colors[len(traces) % len(colors)]
+                    # min/max band of the buckets behind the mean
+                    for fill in (None, "tonexty"):
+                        fig.add_trace(
+                            go.Scatter(
+                                mode="lines",
+                                line=dict(width=0, color=color),
+                                fill=fill,
+                                opacity=0.2,
+                                showlegend=False,
+                                hoverinfo="skip",
+                            )
+                        )
+                    buffer = TraceBuffer(len(fig.data), band=(len(fig.data) - 2, len(fig.data) - 1))
+                    buffer.append(points)
+                    traces[key] = buffer
+                    unit = next((p.get("unit") for p in points if p.get("unit")), "")
+
+                    trace_name = influx_schema.label(key)
+                    if unit:
+                        trace_name += f" [{unit}]"
+
+                    fig.add_trace(
+                        go.Scatter(
+                            mode="lines+markers",
+                            name=trace_name,
+                            line=dict(width=2, color=color),
+                            marker=dict(size=3),
                         )
+                    )
+                    buffer.to_figure(fig)
+
+                if fig.data:
+                    fig.update_layout(
+                        title=f"Device: {device_name}",
+                        xaxis_title="Time",
+                        yaxis_title="Values",
+                        height=400,
+                        hovermode="x unified",
+                    )
 
-                        # Create plot widget and store reference
-                        with ui.card().classes("w-full mb-4"):
-                            ui.label(f"📊 {device_name}").classes("text-lg font-bold")
-                            plot_widget = ui.plotly(fig).classes("w-full")
+                    # Create plot widget and store reference
+                    with ui.card().classes("w-full mb-4"):
+                        ui.label(f"📊 {device_name}").classes("text-lg font-bold")
+                        plot_widget = ui.plotly(fig).classes("w-full")
 
-                            # Store references for updates
-                            plot_figures[device_name] = {
-                                "figure": fig,
-                                "widget": plot_widget,
-                                "measurements": measurements,
-                                "db_name": db_name,
-                            }
+                        # Store references for updates
+                        plot_figures[device_name] = {
+                            "figure": fig,
+                            "widget": plot_widget,
+                            "traces": traces,
+                            "updates": 0,  # live updates since the last full update
+                        }
 
-        client.close()
         ui.notify("Plots created for live updates", type="positive")
 
     except Exception as e:
@@ -666,56 +914,112 @@ def create_plots(hours_input, plots_container):
         ui.notify(f"Error creating plots: {e}", type="negative")
 
 
+def refresh_plot(plot_data, trimmed=False):
+    """
+    Sends only the new points of the traces to the browser (Plotly.extendTraces), the browser trims the old points.
+    The whole figure is sent every PLOT_FULL_UPDATE_INTERVAL updates, so that new browser sessions are up to date,
+    and if points only left the time window.
+    """
+    extension = [change for buffer in plot_data["traces"].values() for change in buffer.take_extension()]
+    if not extension and not trimmed:
+        return
+    plot_data["updates"] += 1
+    if not extension or plot_data["updates"] >= PLOT_FULL_UPDATE_INTERVAL:
+        for buffer in plot_data["traces"].values():
+            buffer.to_figure(plot_data["figure"])
+        plot_data["widget"].update()
+        plot_data["updates"] = 0
+        return
+    widget = plot_data["widget"]
+    widget.client.run_javascript(
+        f"{{ const gd = getHtmlElement({widget.id});"
+        f"const changes = {json.dumps(extension)};"
+        "if (gd && gd.data) {"
+        "  for (const [i, drop] of changes) if (drop) { gd.data[i].x.splice(-drop); gd.data[i].y.splice(-drop); }"
+        "  Plotly.extendTraces(gd, {x: changes.map(c => c[2]), y: changes.map(c => c[3])},"
+        "    changes.map(c => c[0]), changes.map(c => c[4]));"
+        "} }"
+    )
+
+
 def update_live_plots_data(hours_input):
     """Update only the data in existing plots"""
     global plot_figures
-    global influxDB_address, influxDB_port, influxDB_user, influxDB_password
 
     if not plot_figures:
         return
 
     try:
-        client = InfluxDBClient(influxDB_address, influxDB_port, username=influxDB_user, password=influxDB_password)
         hours = hours_input.value or 1
+        window_start = influx_schema.now_ms() - int(hours) * 3600 * 1000
+
+        # one request from the oldest last bucket of all traces, the last bucket may have new values.
+        # Traces without new values (e.g. of a disconnected device) do not hold back the start.
+        buffers = [
+            buffer
+            for plot_data in plot_figures.values()
+            for buffer in plot_data["traces"].values()
+            if buffer.last_ts is not None
+        ]
+        last_ts = min(
+            (buffer.last_ts for buffer in buffers if buffer.advanced),
+            default=max((buffer.last_ts for buffer in buffers), default=window_start),
+        )
+        last_ts = max(last_ts, window_start)
+        with influx_pool.client() as client:
+            data = query_devices(client, list(plot_figures), f"time >= {last_ts}ms", plot_bucket(hours, plot_period))
 
         for device_name, plot_data in plot_figures.items():
             try:
-                client.switch_database(plot_data["db_name"])
-
-                # Update each trace
-                for i, measurement in enumerate(plot_data["measurements"]):
-                    try:
-                        # FIX: Correct time syntax
-                        query = f'SELECT * FROM "{measurement}" WHERE time > now() - {int(hours)}h ORDER BY time ASC'
-                        result = client.query(query)
-                        points = list(result.get_points())
-
-                        if points:
-                            new_times = [p["time"] for p in points]
-                            new_values = [p["value"] for p in points]
-
-                            # Update trace data
-                            if i < len(plot_data["figure"].data):
-                                plot_data["figure"].data[i].x = new_times
-                                plot_data["figure"].data[i].y = new_values
-                    except Exception as e:
-                        print(f"Error updating measurement {measurement}: {e}")
-                        continue
+                trimmed = False
+                for key, buffer in plot_data["traces"].items():
+                    points = data[device_name].get(key, [])
+                    if buffer.last_ts is not None:
+                        points = [p for p in points if p["time"] >= buffer.last_ts]
+                    buffer.advanced = buffer.append(points)
+                    trimmed |= buffer.cap(plot_max_points) | buffer.trim(window_start)
 
-                # Refresh the plot widget
-                plot_data["widget"].update()
+                # Send the new points to the plot widget
+                refresh_plot(plot_data, trimmed)
 
             except Exception as e:
                 print(f"Error updating device {device_name}: {e}")
                 continue
 
-        client.close()
-        # print(f"Plot data updated at {datetime.now().strftime('%H:%M:%S')}")
-
     except Exception as e:
         print(f"Error updating plot data: {e}")
 
 
+def update_live_plots_from_stream(hours_input):
+    """Update the plots from the ring buffers of the MQTT stream, without querying InfluxDB"""
+    if not plot_figures:
+        return
+
+    hours = hours_input.value or 1
+    window_start = influx_schema.now_ms() - int(hours) * 3600 * 1000
+    # downsample the stream like the backfill, so that a trace keeps at most plot_max_points
+    bucket = plot_bucket(hours, plot_period)
+
+    for device_name, plot_data in plot_figures.items():
+        trimmed = False
+        for key, buffer in plot_data["traces"].items():
+            with live_buffers_lock:
+                ring = live_buffers.get((device_name, key))
+                # samples in the last backfilled bucket may be counted twice, this only affects its mean
+                start = buffer.stream_ts if buffer.stream_ts is not None else buffer.last_ts
+                samples = ring.since(start) if ring is not None else []
+            if samples:
+                buffer.stream_ts = samples[-1]["time"]
+            if bucket:
+                buffer.fold(samples, bucket * 1000)
+            else:
+                buffer.append(samples)
+            trimmed |= buffer.cap(plot_max_points) | buffer.trim(window_start)
+
+        # Send the new points to the plot widget
+        refresh_plot(plot_data, trimmed)
+
+
 # Modified live plot functions
 def start_live_plots(hours_input, plots_container):
     """Start live plot updates with data-only updates"""
@@ -728,9 +1032,12 @@ def start_live_plots(hours_input, plots_container):
     # Create plots once
     create_plots(hours_input, plots_container)
 
-    # Start timer for data updates only
+    # Start timer for data updates only, InfluxDB was only needed for the history
     live_plots_active = True
-    plot_timer = ui.timer(1.0, lambda: update_live_plots_data(hours_input))
+    if live_plot_source == "mqtt":
+        plot_timer = ui.timer(1.0, lambda: update_live_plots_from_stream(hours_input))
+    else:
+        plot_timer = ui.timer(1.0, lambda: update_live_plots_data(hours_input))
 
     ui.notify("Live plots started (1s data updates)", type="positive")
 
@@ -749,31 +1056,21 @@ def stop_live_plots():
 
 def show_device_info(device_select, device_info_container):
     """Show available measurements for selected device"""
-    global influxDB_address, influxDB_port, influxDB_user, influxDB_password
 
     if not device_select.value:
         return
 
     try:
         device_name = device_select.value
-        db_name = f"device_{device_name}"
 
-        client = InfluxDBClient(influxDB_address, influxDB_port, username=influxDB_user, password=influxDB_password, database=db_name)
-        result = client.query("SHOW MEASUREMENTS")
-        measurements = [list(point.values())[0] for point in result.get_points()]
-        client.close()
+        with influx_pool.client() as client:
+            measurements = influx_schema.series(client, device_name)
 
         device_info_container.clear()
         with device_info_container:
             ui.label(f"Available datapoints for {device_name}:").classes("font-bold")
             for measurement in measurements:
-                # Split fp_dp back to readable format
-                parts = measurement.split("_", 1)
-                if len(parts) == 2:
-                    fp, dp = parts
-                    ui.label(f"• {fp} - {dp}").classes("ml-4 text-sm")
-                else:
-                    ui.label(f"• {measurement}").classes("ml-4 text-sm")
+                ui.label(f"• {measurement['label']}").classes("ml-4 text-sm")
 
     except Exception as e:
         with device_info_container:
@@ -0,0 +1,95 @@
+"""
+---------------------------------------------------------------
+OpenCEM InfluxDB client pool
+Persistent InfluxDB clients for the queries of the GUI,
+kept out of the data logger and its worker process
+---------------------------------------------------------------
+Fachhochschule Nordwestschweiz, Institut für Automation
+Authors: Prof. Dr. D. Zogg, S. Ferreira, Ch. Zeltner, M. Krebs
+Version: 2.1, February 2026
+---------------------------------------------------------------
+"""
+import contextlib
+import queue
+import threading
+import time
+from influxdb import InfluxDBClient
+from OpenCEM.cem_lib_metrics import metrics
+
+
+class MeteredInfluxDBClient(InfluxDBClient):
+    """
+    InfluxDBClient that reports the duration and errors of its queries.
+    """
+
+    def query(self, query, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().query(query, *args, **kwargs)
+        except Exception:
+            metrics.increment("opencem_gui_influx_query_errors_total")
+            raise
+        finally:
+            metrics.observe("opencem_gui_influx_query_seconds", time.perf_counter() - start)
+
+
+class InfluxClientPool:
+    """
+    Pool of persistent InfluxDB clients. Each client keeps its HTTP session, so the connection
+    is reused across queries instead of being set up for every call.
+    """
+
+    def __init__(self, host="localhost", port=8086, user="", password="", size=4, timeout=10.0):
+        """
+        Args:
+            host (str): Hostname of the InfluxDB server.
+            port (int): Port of the InfluxDB server.
+            user (str): User name.
+            password (str): Password.
+            size (int): Maximum number of clients.
+            timeout (float): Timeout per query in seconds.
+        """
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.idle = queue.LifoQueue()  # the most recently used client has an open connection
+        self.created = 0
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def client(self):
+        """
+        Borrows a client, waits up to the timeout if all clients are in use.
+        """
+        client = self._acquire()
+        try:
+            yield client
+        finally:
+            self.idle.put(client)
+            metrics.set_gauge("opencem_gui_influx_clients_idle", self.idle.qsize())
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self.created < self.size
+            if create:
+                self.created += 1
+        if not create:
+            return self.idle.get(timeout=self.timeout)
+        metrics.increment("opencem_gui_influx_clients_created_total")
+        return MeteredInfluxDBClient(
+            self.host, self.port, username=self.user, password=self.password, timeout=self.timeout
+        )
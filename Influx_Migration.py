@@ -0,0 +1,190 @@
+"""
+---------------------------------------------------------------
+OpenCEM InfluxDB migration
+Copies the values of the per-device databases (device_<name>)
+into the single database of the tagged schema
+---------------------------------------------------------------
+Fachhochschule Nordwestschweiz, Institut für Automation
+Authors: Prof. Dr. D. Zogg, S. Ferreira, Ch. Zeltner, M. Krebs
+Version: 2.1, February 2026
+---------------------------------------------------------------
+"""
+
+import argparse
+import logging
+import os
+import yaml
+from influxdb import InfluxDBClient
+from sgr_commhandler.device_builder import DeviceBuilder
+import config_helper
+from Data_Logger import InfluxSchema, quote_ident
+
+logger = logging.getLogger(__name__)
+
+# Load configuration from YAML file
+config_path = os.environ.get('CONFIG_PATH', 'settings')
+try:
+    with open(os.path.join(config_path, "OpenCEM_settings.yaml"), "r") as file:
+        config = yaml.safe_load(file)
+except Exception:
+    config = {}
+
+# Override configuration with environment variables
+influxDB_address = config_helper.get_setting('INFLUX_HOST', 'influxDB_address', settings=config, default_value='localhost')
+influxDB_port = int(config_helper.get_setting('INFLUX_PORT', 'influxDB_port', settings=config, default_value=8086))
+influxDB_user = config_helper.get_setting('INFLUX_USER', 'influxDB_user', settings=config, default_value='')
+influxDB_password = config_helper.get_setting('INFLUX_PASSWORD', 'influxDB_password', settings=config, default_value='')
+influx_database = config_helper.get_setting('INFLUX_DATABASE', 'influx_database', settings=config, default_value='openCEM')
+xml_path = os.environ.get('XML_PATH', 'xml_files')
+
+
+def load_datapoints(config_file):
+    """
+    Collects the datapoints of each device from config.yaml and the datapoints described by its EID.
+
+    Args:
+        config_file (str): Path of config.yaml.
+
+    Returns:
+        dict: Device name -> set of (fp, dp).
+    """
+    with open(config_file, "r") as f:
+        installation = yaml.safe_load(f) or {}
+    datapoints = {}
+    for device in installation.get("devices") or []:
+        pairs = datapoints.setdefault(device["name"], set())
+        pairs.update((dp["fp"], dp["dp"]) for dp in device.get("datapoints", []))
+        if not device.get("smartGridreadyEID"):
+            continue
+        try:
+            # all datapoints of the EID, also the ones that are no longer configured,
+            # built with the parameters of the device like OpenCEM does
+            eid = (
+                DeviceBuilder()
+                .eid_path(os.path.join(xml_path, device["smartGridreadyEID"]))
+                .properties(device.get("parameters") or {})
+                .build()
+            )
+            description = eid.describe()[1]
+            pairs.update((fp, dp) for fp, dps in description.items() for dp in dps.keys())
+        except Exception as e:
+            logger.warning("EID not readable, only the configured datapoints are known: device=%s error=%s", device["name"], e)
+    return datapoints
+
+
+def split_measurement(measurement, known_pairs):
+    """
+    Finds fp and dp of a per-device measurement <fp>_<dp>. Both names may contain '_'.
+
+    Args:
+        measurement (str): Measurement name.
+        known_pairs (set): (fp, dp) of the device, see load_datapoints.
+
+    Returns:
+        tuple: (fp, dp), None if the name is ambiguous.
+    """
+    candidates = {pair for pair in known_pairs if f"{pair[0]}_{pair[1]}" == measurement}
+    if not candidates and measurement.count("_") == 1:
+        # unknown datapoint, but there is only one way to split the name
+        candidates = {tuple(measurement.split("_"))}
+    return candidates.pop() if len(candidates) == 1 else None
+
+
+def migrate_measurement(client, schema, device_name, measurement, fp, dp, chunk_size=10000):
+    """
+    Copies one measurement <fp>_<dp> of a per-device database in chunks.
+
+    Args:
+        client (InfluxDBClient): Connected client.
+        schema (InfluxSchema): Tagged target schema.
+        device_name (str): Name of the device.
+        measurement (str): Measurement of the datapoint.
+        fp (str): Functional profile of the datapoint.
+        dp (str): Datapoint name.
+        chunk_size (int): Points read and written per request.
+
+    Returns:
+        int: Number of copied points.
+    """
+    source = f"device_{device_name}"
+    last_time = None
+    count = 0
+    while True:
+        where = "" if last_time is None else f"WHERE time > {last_time} "
+        result = client.query(
+            f"SELECT * FROM {quote_ident(measurement)} {where}ORDER BY time ASC LIMIT {chunk_size}",
+            database=source,
+            epoch="ns",
+        )
+        points = [
+            schema.make_point(
+                device_name,
+                {"fp": fp, "dp": dp, "value": p.get("value"), "unit": p.get("unit") or "NONE", "error_code": p.get("error_code", 0)},
+                p["time"],
+            )
+            for p in result.get_points()
+        ]
+        if not points:
+            return count
+        client.write_points(points, database=schema.database, time_precision="n")
+        count += len(points)
+        last_time = points[-1]["time"]
+
+
+def migrate(client, schema, datapoints, drop_source=False):
+    """
+    Copies all per-device databases into the database of the tagged schema.
+    Measurements whose fp and dp cannot be determined are skipped, their database is never dropped.
+
+    Args:
+        client (InfluxDBClient): Connected client.
+        schema (InfluxSchema): Tagged target schema.
+        datapoints (dict): Device name -> set of (fp, dp), see load_datapoints.
+        drop_source (bool): Drop the per-device databases after they were copied.
+
+    Returns:
+        bool: True if all measurements were migrated.
+    """
+    client.create_database(schema.database)
+    complete = True
+    for device_name in InfluxSchema("per_device").devices(client):
+        source = f"device_{device_name}"
+        measurements = [point["name"] for point in client.query("SHOW MEASUREMENTS", database=source).get_points()]
+        skipped = 0
+        for measurement in measurements:
+            pair = split_measurement(measurement, datapoints.get(device_name, set()))
+            if pair is None:
+                logger.error(
+                    "Measurement skipped, fp and dp are ambiguous, add the datapoint to config.yaml: device=%s measurement=%s",
+                    device_name,
+                    measurement,
+                )
+                skipped += 1
+                continue
+            count = migrate_measurement(client, schema, device_name, measurement, *pair)
+            logger.info(
+                "Measurement migrated: device=%s measurement=%s fp=%s dp=%s points=%d", device_name, measurement, *pair, count
+            )
+        if skipped:
+            complete = False
+            if drop_source:
+                logger.warning("Database kept, not all measurements were migrated: database=%s skipped=%d", source, skipped)
+        elif drop_source:
+            client.drop_database(source)
+            logger.info("Database dropped: database=%s", source)
+    return complete
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrates the per-device InfluxDB databases to the tagged schema")
+    parser.add_argument("--database", default=influx_database, help="database of the tagged schema")
+    parser.add_argument("--drop-source", action="store_true", help="drop the per-device databases after copying")
+    parser.add_argument("--config", default=os.path.join(config_path, "config.yaml"), help="config.yaml with the devices and EIDs")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="time=%(asctime)s level=%(levelname)s msg=%(message)s")
+    influx_client = InfluxDBClient(influxDB_address, influxDB_port, username=influxDB_user, password=influxDB_password)
+    complete = migrate(influx_client, InfluxSchema("tagged", args.database), load_datapoints(args.config), args.drop_source)
+    influx_client.close()
+    if not complete:
+        raise SystemExit("Not all measurements were migrated, see the log")
@@ -11,30 +11,236 @@ Version: 2.1, February 2026
 """
 
 import asyncio
-import datetime
+import logging
+import math
+import queue
+import time
 import yaml
-from OpenCEM.cem_lib_components import Device
+from OpenCEM.cem_lib_components import Device, serialize_snapshot
+from OpenCEM.cem_lib_metrics import metrics
+from OpenCEM.cem_lib_publishing import PAYLOAD_VERSION
 import OpenCEM.cem_lib_components
 import json
 import os
 
+logger = logging.getLogger(__name__)
 
-async def calculation_loop(devices_list: list, period: int, MQTT_client):
+
+async def calculation_loop(
+    devices_list: list,
+    period: int,
+    publisher,
+    concurrent_polling: bool = False,
+    max_concurrent_reads: int = 4,
+    read_timeout: float = None,
+    tick_policy: str = "skip",
+    snapshot_queue=None,
+):
 
     simulation_speed_up_factor = OpenCEM.cem_lib_components.simulation_speed_up_factor
+    tick_period = get_tick_period(devices_list, period)
+    logger.info("Calculation loop started: tick_period=%ss policy=%s", tick_period, tick_policy)
+    scheduler = TickScheduler(tick_period / simulation_speed_up_factor, tick_policy)
     while True:
 
-        # read all devices
-        for device in devices_list:
-            await device.read()
+        # wait for the next tick (other tasks may run)
+        now = await scheduler.wait_next_tick()
+        tick_start = time.perf_counter()
+        metrics.observe("opencem_tick_lateness_seconds", scheduler.lateness)
+
+        # read the devices with datapoints that are due
+        due_devices = [device for device in devices_list if device.due_datapoints(now)]
+        if not due_devices:
+            # nothing is read in this tick, the last values were already published and logged
+            continue
+        if concurrent_polling:
+            await read_devices_concurrently(
+                due_devices, max_concurrent_reads, read_timeout, now
+            )
+        else:
+            for device in due_devices:
+                await device.read(now)
         # update webpage
+        start = time.perf_counter()
         value_dict = create_dict(devices_list)
+        metrics.observe("opencem_create_dict_seconds", time.perf_counter() - start)
+
+        # only encodes and queues the messages, they are sent by the publish queue
+        start = time.perf_counter()
+        publisher.publish(value_dict)
+        metrics.observe("opencem_publish_enqueue_seconds", time.perf_counter() - start)
+
+        # hand the snapshot to the data logger in this process, no encoding and no broker round trip
+        if snapshot_queue is not None:
+            put_snapshot(snapshot_queue, value_dict)
+        for device in due_devices:
+            device.snapshot.clear_fresh()
+        metrics.observe("opencem_tick_seconds", time.perf_counter() - tick_start)
+        logger.debug(
+            "Tick: tick=%d lateness=%.1fms overruns=%d missed_ticks=%d",
+            scheduler.tick_count,
+            scheduler.lateness * 1000,
+            scheduler.overrun_count,
+            scheduler.missed_ticks,
+        )
+
+
+class TickScheduler:
+    """
+    Fixed-rate scheduler for the calculation loop.
+    The deadlines are anchored to the monotonic clock, so the time spent reading and publishing
+    does not shift the following ticks. If a tick overruns the next deadline, the policy decides:
+    - "skip": missed ticks are dropped and the loop continues on the next deadline
+    - "catch_up": missed ticks are run immediately one after another
+    """
+
+    POLICIES = ("skip", "catch_up")
+
+    def __init__(self, period: float, policy: str = "skip"):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown tick policy '{policy}', use one of {self.POLICIES}")
+        self.period = period  # seconds (real time)
+        self.policy = policy
+        self.next_deadline = None
+
+        self.tick_count = 0
+        self.overrun_count = 0  # ticks that were not finished before the next deadline
+        self.missed_ticks = 0  # ticks dropped by the skip policy
+        self.lateness = 0.0  # delay of the current tick behind its deadline in seconds
+
+    async def wait_next_tick(self) -> float:
+        """
+        Waits for the next deadline.
+        :return: deadline of the tick (monotonic time)
+        """
+        now = time.monotonic()
+        if self.next_deadline is None:
+            self.next_deadline = now
+        elif now > self.next_deadline:
+            # the previous tick overran
+            self.overrun_count += 1
+            metrics.increment("opencem_tick_overruns_total")
+            logger.warning("Tick overrun: late=%.1fms policy=%s", (now - self.next_deadline) * 1000, self.policy)
+            if self.policy == "skip":
+                missed = int((now - self.next_deadline) // self.period)
+                self.next_deadline += missed * self.period
+                self.missed_ticks += missed
+                metrics.increment("opencem_tick_missed_total", missed)
+
+        delay = self.next_deadline - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        deadline = self.next_deadline
+        self.lateness = max(0.0, time.monotonic() - deadline)
+        self.next_deadline = deadline + self.period
+        self.tick_count += 1
+        return deadline
+
+
+def put_snapshot(snapshot_queue: queue.Queue, value_dict: dict):
+    """
+    Puts a snapshot into the bounded queue of the data logger without blocking the calculation loop.
+    If the logger falls behind, the oldest snapshot is dropped.
+    :param snapshot_queue: queue.Queue read by the data logger or sent to the logger process
+    :param value_dict: dict of create_dict, must not be changed afterwards
+    """
+    while True:
+        try:
+            snapshot_queue.put_nowait(value_dict)
+            break
+        except queue.Full:
+            try:
+                snapshot_queue.get_nowait()
+                metrics.increment("opencem_logger_queue_dropped_total")
+            except queue.Empty:
+                pass
+    metrics.set_gauge("opencem_logger_queue_depth", snapshot_queue.qsize())
+
+
+def get_tick_period(devices_list: list, period: float) -> float:
+    """
+    Calculates the tick period of the calculation loop from the polling intervals of all datapoints.
+    The tick period is the greatest common divisor of all intervals, so that every datapoint is read on time.
+    :param devices_list: devices with their datapoint intervals
+    :param period: default period for datapoints without an interval
+    :return: tick period in seconds
+    """
+    intervals = {period}
+    for device in devices_list:
+        intervals.update(
+            period if interval is None else interval for interval in device.dp_intervals
+        )
+    return gcd_period(intervals)
+
+
+def gcd_period(intervals) -> float:
+    """
+    Greatest common divisor of polling intervals.
+    :param intervals: intervals in seconds
+    :return: period in seconds
+    """
+    # greatest common divisor in milliseconds (intervals may be fractions of a second)
+    tick_ms = 0
+    for interval in intervals:
+        tick_ms = math.gcd(tick_ms, max(1, round(interval * 1000)))
+    return tick_ms / 1000
 
-        MQTT_client.publish("openCEM/value", json.dumps(value_dict))
-        print("-----------------------------------------------")
 
-        # sleep for a defined period (other tasks may run)
-        await asyncio.sleep(period / simulation_speed_up_factor)
+async def read_devices_concurrently(
+    devices_list: list,
+    max_concurrent_reads: int,
+    read_timeout: float = None,
+    now: float = None,
+):
+    """
+    Reads all devices concurrently. A device that does not answer within the timeout is marked stale,
+    so that the values of the other devices can still be published in time.
+    :param devices_list: devices to read
+    :param max_concurrent_reads: maximum number of devices that are read at the same time
+    :param read_timeout: timeout for the requests of one device in seconds (None or 0 = no timeout)
+    :param now: monotonic time of the tick, used to select the due datapoints (None = all datapoints)
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrent_reads))
+
+    async def read_device(device):
+        async with semaphore:
+            try:
+                # the timeout is applied inside the transport lock, a busy Modbus bus does not time out
+                await device.read(now, timeout=read_timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Timeout reading device: device=%s timeout=%ss", device.name, read_timeout)
+                metrics.increment("opencem_device_read_timeouts_total", device=device.name)
+                device.mark_stale(failed=True)
+            except Exception as e:
+                logger.warning("Error reading device: device=%s error=%s", device.name, e)
+                device.mark_stale(failed=True)
+
+    await asyncio.gather(*(read_device(device) for device in devices_list))
+
+
+async def metrics_loop(MQTT_client, interval: float, topic: str = "openCEM/metrics"):
+    """
+    Publishes the metrics of the calculation loop and the device reads periodically as JSON.
+    :param MQTT_client: MQTT client or PublishQueue
+    :param interval: publish interval in seconds
+    :param topic: MQTT topic for the metrics
+    """
+    while True:
+        await asyncio.sleep(interval)
+        MQTT_client.publish(topic, json.dumps(metrics.to_dict()))
+
+
+def setup_logging(log_level: str = "INFO"):
+    """
+    Configures the log output of OpenCEM. Messages are formatted as key=value pairs.
+    Debug messages of the read and publish path are only formatted if the level is DEBUG.
+    :param log_level: name of the log level, e.g. DEBUG, INFO, WARNING
+    """
+    logging.basicConfig(
+        level=getattr(logging, str(log_level).upper(), logging.INFO),
+        format="time=%(asctime)s level=%(levelname)s logger=%(name)s msg=%(message)s",
+    )
 
 
 def create_dict(devices_list: list) -> dict:
@@ -42,17 +248,19 @@ def create_dict(devices_list: list) -> dict:
     This function will create a dict with the important information of the devices. Used for the GUI.
     :param devices_list:
     :return: dict with device information. Will be sent later tothe GUI
+             keys: 'version', 'timestamp_ms' (epoch milliseconds) and 'devices_list'
     """
     return_dict = {}
     devices_dict_list = []
-    return_dict["timestamp"] = datetime.datetime.now().strftime("%d/%m/%Y, %H:%M:%S")
-    # print("devices_list", devices_list)
+    return_dict["version"] = PAYLOAD_VERSION
+    return_dict["timestamp_ms"] = time.time_ns() // 1_000_000
 
     for device in devices_list:
         device_dict = {}
         try:
             device_dict["name"] = device.name
-            device_dict["datapoints"] = device.datapoint_values
+            # straight from the records, no intermediate copies
+            device_dict["datapoints"] = serialize_snapshot(device.snapshot)
 
             devices_dict_list.append(device_dict)
 
@@ -64,10 +272,20 @@ def create_dict(devices_list: list) -> dict:
     return return_dict
 
 
-async def parse_yaml(path2configurationYaml: str):
+async def parse_yaml(
+    path2configurationYaml: str,
+    default_interval: float = None,
+    max_concurrent_connects: int = 4,
+    connect_timeout: float = None,
+):
     """
     This function reads a configuration yaml, creates instances of devices, sensors, etc. and connects them.
+    The devices are connected concurrently. Devices that fail to connect are reconnected in the background,
+    so that the calculation loop can start with the reachable devices.
     :param path2configurationYaml: The YAML configuration that should get parsed
+    :param default_interval: polling interval for devices and datapoints without an own interval
+    :param max_concurrent_connects: maximum number of devices connected at the same time
+    :param connect_timeout: timeout per device connect in seconds (None or 0 = no timeout)
     :return: lists for communicationChannels, devices and controllers
     """
     xml_path = os.environ.get('XML_PATH', 'xml_files')
@@ -82,29 +300,41 @@ async def parse_yaml(path2configurationYaml: str):
             devices_data = data["devices"]
 
             for device in devices_data:
-                print("device", device)
+                logger.debug("Device configuration: %s", device)
                 name = device.get("name")
                 smartgridreadyEID = os.path.join(xml_path, device.get("smartGridreadyEID"))
                 EID_param = device.get("parameters")
                 dp_list = device.get("datapoints", [])
+                interval = device.get("interval", default_interval)
 
                 device_temporary = Device(
                     name=name,
                     smartGridreadyEID=smartgridreadyEID,
                     param=EID_param,
                     dp_list=dp_list,
+                    interval=interval,
                 )
 
-                if smartgridreadyEID is not None:
-                    print("smartgridreadyEID", smartgridreadyEID)
-                    print("EID_param", EID_param)
-                    print(type(EID_param))
-                    await device_temporary.connect(
-                        smartgridreadyEID, EID_param
-                    )  # initialize the device with the SGr EID and parameters
-
                 devices_list.append(
                     device_temporary
                 )  # add the device to the list and continue for loop with the next device
 
+        # initialize the devices with the SGr EID and parameters
+        semaphore = asyncio.Semaphore(max(1, max_concurrent_connects))
+
+        async def connect_device(device):
+            async with semaphore:
+                if await device.try_connect(connect_timeout):
+                    logger.info("Device connected: device=%s", device.name)
+                else:
+                    device.schedule_reconnect()
+
+        await asyncio.gather(
+            *(
+                connect_device(device)
+                for device in devices_list
+                if device.smartGridreadyEID is not None
+            )
+        )
+
         return devices_list
@@ -10,35 +10,233 @@ Version: 2.1, February 2026
 ---------------------------------------------------------------
 """
 
+import asyncio
+import logging
+import time
 from sgr_commhandler.device_builder import DeviceBuilder
+from sgr_commhandler.driver.modbus.modbus_interface_async import SGrModbusInterface
+from OpenCEM.cem_lib_metrics import metrics
+
+logger = logging.getLogger(__name__)
 
 
 # Simulation parameters:
 simulation_speed_up_factor = 1.0  # will be overwritten by setting yaml
 sim_start_time = None
 
+due_tolerance = 0.001  # datapoints due within this time in seconds are read in the current tick
+
+# circuit breaker for failing devices and datapoints (will be overwritten by setting yaml)
+breaker_failure_threshold = 3  # consecutive failures until polling stops
+breaker_backoff_min = 10  # seconds until the first probe
+breaker_backoff_max = 600  # seconds, the backoff doubles after each failed probe
+
+# one lock per Modbus transport (serial port or TCP address), Modbus requests must not overlap
+modbus_transport_locks = {}
+
+
+class CircuitBreaker:
+    """
+    Stops polling a failing device or datapoint.
+    After failure_threshold consecutive failures the breaker opens. When the backoff has passed, one probe
+    is allowed: a success closes the breaker, a failure opens it again with the doubled backoff.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = None,
+        backoff_min: float = None,
+        backoff_max: float = None,
+    ):
+        self.failure_threshold = failure_threshold or breaker_failure_threshold
+        self.backoff_min = backoff_min or breaker_backoff_min
+        self.backoff_max = backoff_max or breaker_backoff_max
+
+        self.failures = 0  # consecutive failures
+        self.backoff = self.backoff_min
+        self.open_until = None  # monotonic time of the next probe, None = closed
+
+    @property
+    def is_open(self) -> bool:
+        return self.open_until is not None
+
+    def allow(self, now: float) -> bool:
+        # True if the breaker is closed or the next probe is due
+        return self.open_until is None or now >= self.open_until
+
+    def record_success(self):
+        self.failures = 0
+        self.backoff = self.backoff_min
+        self.open_until = None
+
+    def record_failure(self, now: float):
+        self.failures += 1
+        if self.open_until is not None:
+            # failed probe
+            self.backoff = min(self.backoff * 2, self.backoff_max)
+            self.open_until = now + self.backoff
+        elif self.failures >= self.failure_threshold:
+            self.open_until = now + self.backoff
+
+
+class DatapointRecord:
+    # last value of one datapoint, allocated once and updated in place by Device.read()
+
+    __slots__ = ("fp", "dp", "value", "unit", "error_code", "stale", "fresh")
+
+    def __init__(self, fp: str, dp: str):
+        self.fp = fp
+        self.dp = dp
+        self.value = 0
+        self.unit = "ERROR"
+        self.error_code = 1
+        self.stale = True
+        self.fresh = False  # read or marked stale in the current tick
+
+    def update(self, value, unit: str, error_code: int):
+        self.value = value
+        self.unit = unit
+        self.error_code = error_code
+        self.stale = False
+        self.fresh = True
+
+
+class DeviceSnapshot:
+    # last values of all datapoints of a device, preallocated from dp_list
+
+    __slots__ = ("records",)
+
+    def __init__(self, dp_list: list):
+        self.records = [DatapointRecord(dp_entry["fp"], dp_entry["dp"]) for dp_entry in dp_list]
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __getitem__(self, index: int) -> DatapointRecord:
+        return self.records[index]
+
+    def clear_fresh(self):
+        # called after the snapshot of a tick was handed off
+        for record in self.records:
+            record.fresh = False
+
+
+def serialize_snapshot(snapshot: DeviceSnapshot) -> list:
+    """
+    Serializes the records of a snapshot in one pass, reading their slots directly.
+    :param snapshot: DeviceSnapshot of a device
+    :return: list of dicts with keys 'fp', 'dp', 'value', 'unit', 'error_code', 'stale', 'fresh'
+    """
+    return [
+        {
+            "fp": r.fp,
+            "dp": r.dp,
+            "value": r.value,
+            "unit": r.unit,
+            "error_code": r.error_code,
+            "stale": r.stale,
+            "fresh": r.fresh,
+        }
+        for r in snapshot.records
+    ]
+
+
+class PreparedDataPoint:
+    # datapoint resolved once at connect time, reading it only performs I/O
+
+    def __init__(self, functional_profile: str, data_point: str, dp):
+        self.functional_profile = functional_profile
+        self.data_point = data_point
+        self.dp = dp  # commhandler data point
+        self.unit = dp.unit().name if dp.unit() else "NONE"
+
 
 class SmartGridreadyComponent:
 
-    def __init__(self):
+    def __init__(self, name: str = ""):
+        self.name = name  # name of the device, used for metrics
         self.device = None
 
     async def connect(self, XML_file: str, EID_param: dict):
-        print(f"SmartGridready Component connected: {XML_file} with EID {EID_param}")
+        logger.info("SmartGridready Component connected: eid=%s param=%s", XML_file, EID_param)
         self.device = DeviceBuilder().eid_path(XML_file).properties(EID_param).build()
         await self.device.connect_async()
 
-    async def read_value(self, functional_profile: str, data_point: str):
-        # read one value from a given data point within a functional profile
-
-        error_code = 0
-        print(f"SmartGridready Component read value: {functional_profile, data_point}")
-        # dp = self.device.get_functional_profile(functional_profile).get_data_point(data_point)
-        dp = self.device.get_data_point((functional_profile, data_point))
-        value = await dp.get_value_async()
+    def prepare_data_points(self, dp_list: list) -> tuple:
+        """
+        Resolves the configured datapoints once, so that the read path does not have to look them up.
+        :param dp_list: list of dicts with keys 'fp' and 'dp'
+        :return: list of PreparedDataPoint and list of the datapoint entries that could not be resolved
+        """
+        prepared = []
+        rejected = []
+        for dp_entry in dp_list:
+            try:
+                dp = self.device.get_data_point((dp_entry["fp"], dp_entry["dp"]))
+                prepared.append(PreparedDataPoint(dp_entry["fp"], dp_entry["dp"], dp))
+            except Exception as e:
+                logger.error("Datapoint not found: fp=%s dp=%s error=%s", dp_entry.get("fp"), dp_entry.get("dp"), e)
+                rejected.append(dp_entry)
+        return prepared, rejected
+
+    async def read_values(self, data_points: list, timeout: float = None) -> list:
+        """
+        Reads several datapoints of the device in one pass.
+        REST and messaging datapoints are requested concurrently. Modbus requests are serialized by the
+        commhandler, so Modbus datapoints are read one after another while holding the transport lock.
+        The timeout starts once the transport lock is held, waiting for other devices on the same bus does not count.
+        :param data_points: list of PreparedDataPoint
+        :param timeout: timeout for the requests in seconds (None or 0 = no timeout), raises asyncio.TimeoutError
+        :return: [value, unit, error_code] or the exception of a failed read for each datapoint
+        """
+        if isinstance(self.device, SGrModbusInterface):
+            async with self.get_transport_lock():
+                return await asyncio.wait_for(self._read_sequentially(data_points), timeout=timeout or None)
+
+        return await asyncio.wait_for(
+            asyncio.gather(
+                *(self._read_data_point(data_point) for data_point in data_points),
+                return_exceptions=True,
+            ),
+            timeout=timeout or None,
+        )
 
-        unit = dp.unit().name
-        return [value, unit, error_code]
+    async def _read_sequentially(self, data_points: list) -> list:
+        results = []
+        for data_point in data_points:
+            try:
+                results.append(await self._read_data_point(data_point))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    async def _read_data_point(self, data_point: PreparedDataPoint):
+        start = time.perf_counter()
+        try:
+            value = await data_point.dp.get_value_async()
+        finally:
+            # failed reads are measured as well, they usually take longest
+            metrics.observe(
+                "opencem_datapoint_read_seconds",
+                time.perf_counter() - start,
+                device=self.name,
+                fp=data_point.functional_profile,
+                dp=data_point.data_point,
+            )
+        return [value, data_point.unit, 0]
+
+    def get_transport_lock(self) -> asyncio.Lock:
+        # devices on the same serial port or TCP address share one lock
+        if hasattr(self.device, "ip_address"):
+            key = ("TCP", self.device.ip_address, self.device.ip_port)
+        else:
+            key = ("RTU", self.device.serial_port)
+        if key not in modbus_transport_locks:
+            modbus_transport_locks[key] = asyncio.Lock()
+        return modbus_transport_locks[key]
 
     def write_value(self, functional_profile: str, data_point: str, value):
         # write one value to a given data point within a functional profile
@@ -48,8 +246,11 @@ class SmartGridreadyComponent:
 
         # self.sgr_component.setval(functional_profile, data_point, value)
 
-        print(
-            f"SmartGridready Component write value: {functional_profile, data_point, value}"
+        logger.debug(
+            "SmartGridready Component write value: fp=%s dp=%s value=%s",
+            functional_profile,
+            data_point,
+            value,
         )
 
         return error_code
@@ -68,6 +269,7 @@ class Device:
         isLogging: bool = True,
         param: dict = {},
         dp_list: list = None,
+        interval: float = None,
     ):
 
         self.name = name
@@ -78,57 +280,231 @@ class Device:
         self.isLogging = isLogging
 
         self.param = param
-        self.dp_list = dp_list
+        self.dp_list = dp_list if dp_list is not None else []
+        self.dp_handles = []  # datapoints resolved at connect time
+        self.interval = interval  # default polling interval in seconds for all datapoints
+        self._init_datapoints()
 
-        print(f"Device created: {self.name} type {self.type}")
+        # connection state, a device that is offline or stops responding is reconnected in the background
+        self.connected = False
+        self.smartgridready_Comp = None
+        self.connect_timeout = None
+        self.reconnect_task = None
+        self.reconnect_breaker = CircuitBreaker(failure_threshold=1)
 
-    async def connect(self, smartGridreadyEID, param):
-        print("Connecting to SmartGridready Component...")
-        self.smartgridready_Comp = SmartGridreadyComponent()
-        await self.smartgridready_Comp.connect(smartGridreadyEID, param)
-        print(f"SmartGridready Component initialized: {smartGridreadyEID}")
+        # stops polling the device after repeated failed reads
+        self.circuit_breaker = CircuitBreaker()
 
-    async def read(self):
-        self.datapoint_values = []
+        logger.info("Device created: device=%s type=%s", self.name, self.type)
 
-        for dp_entry in self.dp_list:
+    def _init_datapoints(self):
+        # polling interval and next due time (monotonic clock) per datapoint
+        self.dp_intervals = [dp_entry.get("interval", self.interval) for dp_entry in self.dp_list]
+        self.dp_next_due = [None] * len(self.dp_list)
+        self.pending_dps = set()  # datapoints of the running read
+        self.dp_breakers = [CircuitBreaker() for dp_entry in self.dp_list]
 
-            fp = dp_entry["fp"]
-            dp = dp_entry["dp"]
+        # last values of all datapoints, updated in place by read()
+        self.snapshot = DeviceSnapshot(self.dp_list)
 
-            try:
-                [self.value, unit, error_code] = (
-                    await self.smartgridready_Comp.read_value(fp, dp)
-                )
+    def get_datapoint_values(self) -> list:
+        # builds a list of dicts with the last values of all datapoints, e.g. for debug output
+        return serialize_snapshot(self.snapshot)
+
+    async def connect(self, smartGridreadyEID, param):
+        logger.info("Connecting to SmartGridready Component: device=%s", self.name)
+        self.smartgridready_Comp = SmartGridreadyComponent(self.name)
+        await self.smartgridready_Comp.connect(smartGridreadyEID, param)
+
+        # resolve the datapoints once, datapoints that are not part of the EID are rejected
+        self.dp_handles, rejected = self.smartgridready_Comp.prepare_data_points(self.dp_list)
+        if rejected:
+            logger.error("Rejected datapoints: device=%s datapoints=%s", self.name, rejected)
+            self.dp_list = [dp_entry for dp_entry in self.dp_list if dp_entry not in rejected]
+            self._init_datapoints()
+        self.connected = True
+        logger.info("SmartGridready Component initialized: device=%s eid=%s", self.name, smartGridreadyEID)
+
+    async def try_connect(self, timeout: float = None) -> bool:
+        """
+        Connects the device with a timeout. If the connection fails, read() reconnects the device in the background.
+        :param timeout: timeout in seconds (None or 0 = no timeout)
+        :return: True if the device is connected
+        """
+        self.connect_timeout = timeout
+        try:
+            await asyncio.wait_for(
+                self.connect(self.smartGridreadyEID, self.param), timeout=timeout or None
+            )
+            self.reconnect_breaker.record_success()
+            self.circuit_breaker.record_success()
+            return True
+        except Exception as e:
+            self.connected = False
+            self.reconnect_breaker.record_failure(time.monotonic())
+            logger.warning(
+                "Connect failed: device=%s error=%r retry_in=%ss",
+                self.name,
+                e,
+                self.reconnect_breaker.backoff,
+            )
+            return False
+
+    def schedule_reconnect(self):
+        # start the background reconnect if it is not running, it retries independent of the polling intervals
+        if self.reconnect_task is not None and not self.reconnect_task.done():
+            return
+        self.reconnect_task = asyncio.create_task(self._reconnect_loop())
+
+    def stop_reconnect(self):
+        # cancel the background reconnect, e.g. when OpenCEM is stopped
+        if self.reconnect_task is not None and not self.reconnect_task.done():
+            self.reconnect_task.cancel()
+
+    async def _reconnect_loop(self):
+        while not self.connected:
+            open_until = self.reconnect_breaker.open_until
+            if open_until is not None:
+                await asyncio.sleep(max(0.0, open_until - time.monotonic()))
+            await self._disconnect()
+            await self.try_connect(self.connect_timeout)
+        logger.info("Device reconnected: device=%s", self.name)
+
+    async def _disconnect(self):
+        # close the old connection before a reconnect, the device may not answer
+        if self.smartgridready_Comp is None or self.smartgridready_Comp.device is None:
+            return
+        try:
+            await asyncio.wait_for(self.smartgridready_Comp.device.disconnect_async(), timeout=self.connect_timeout or None)
+        except Exception as e:
+            logger.debug("Disconnect failed: device=%s error=%r", self.name, e)
+
+    def _record_read_failure(self, now: float):
+        # a device that fails repeatedly after it was connected is reconnected
+        self.circuit_breaker.record_failure(now)
+        if self.connected and self.circuit_breaker.is_open:
+            logger.warning(
+                "Device not responding, reconnecting: device=%s failures=%d", self.name, self.circuit_breaker.failures
+            )
+            self.connected = False
+            metrics.increment("opencem_device_disconnects_total", device=self.name)
+            self.schedule_reconnect()
+
+    def due_datapoints(self, now: float = None) -> list:
+        # indexes of the datapoints that have to be read at the monotonic time now (None = all)
+        if now is None:
+            return list(range(len(self.dp_list)))
+        return [
+            index
+            for index, next_due in enumerate(self.dp_next_due)
+            if next_due is None or next_due - now <= due_tolerance
+        ]
+
+    def _schedule_next(self, index: int, now: float):
+        # next due time anchored to the previous one, so that the interval does not drift
+        interval = self.dp_intervals[index]
+        if interval is None or now is None:
+            return
+        period = interval / simulation_speed_up_factor
+        next_due = self.dp_next_due[index]
+        next_due = now + period if next_due is None else next_due + period
+        if next_due - now <= due_tolerance:  # more than one interval behind
+            next_due = now + period
+        self.dp_next_due[index] = next_due
+
+    async def read(self, now: float = None, timeout: float = None):
+        # read the datapoints that are due at the monotonic time now (None = all datapoints)
+        # timeout applies to the requests of the device, see SmartGridreadyComponent.read_values
+        self.pending_dps = set(self.due_datapoints(now))
+
+        if not self.connected:
+            # serve the last values as stale until the device is reconnected
+            self.schedule_reconnect()
+            self.mark_stale()
+            return self.snapshot
+
+        # serve the last values as stale while the circuit breaker of the device is open
+        breaker_time = time.monotonic()
+        if not self.circuit_breaker.allow(breaker_time):
+            self.mark_stale()
+            return self.snapshot
+
+        # skip datapoints with an open circuit breaker
+        due_indexes = [
+            index
+            for index in sorted(self.pending_dps)
+            if self.dp_breakers[index].allow(breaker_time)
+        ]
+        for index in due_indexes:
+            self._schedule_next(index, now)
+
+        # read all due datapoints in one pass
+        start = time.perf_counter()
+        results = await self.smartgridready_Comp.read_values(
+            [self.dp_handles[index] for index in due_indexes], timeout=timeout
+        )
+        metrics.observe("opencem_device_read_seconds", time.perf_counter() - start, device=self.name)
+
+        breaker_time = time.monotonic()
+        failed = 0
+        for index, result in zip(due_indexes, results):
+            fp = self.dp_list[index]["fp"]
+            dp = self.dp_list[index]["dp"]
+
+            if isinstance(result, Exception):
+                logger.warning("Error reading datapoint: device=%s fp=%s dp=%s error=%s", self.name, fp, dp, result)
+                failed += 1
+                self.dp_breakers[index].record_failure(breaker_time)
+                metrics.increment("opencem_datapoint_read_errors_total", device=self.name, fp=fp, dp=dp)
+
+                # keep the last good value, flagged as stale
+                self.snapshot[index].error_code = 1
+                self.snapshot[index].stale = True
+                self.snapshot[index].fresh = True
+            else:
+                [self.value, unit, error_code] = result
+                self.dp_breakers[index].record_success()
 
                 # Store individual datapoint information
-                dp_info = {
-                    "fp": fp,
-                    "dp": dp,
-                    "value": self.value,
-                    "unit": unit,
-                    "error_code": error_code,
-                }
-                print("Device read", self.value, unit, error_code)
-                self.datapoint_values.append(dp_info)
+                self.snapshot[index].update(self.value, unit, error_code)
+                logger.debug(
+                    "Device read: device=%s fp=%s dp=%s value=%s unit=%s error_code=%s",
+                    self.name,
+                    fp,
+                    dp,
+                    self.value,
+                    unit,
+                    error_code,
+                )
 
-            except Exception as e:
-                print(f"Error reading datapoint {fp}/{dp}: {e}")
+            self.pending_dps.discard(index)
+
+        # the device fails if no datapoint could be read
+        if due_indexes and failed == len(due_indexes):
+            self._record_read_failure(breaker_time)
+        elif due_indexes:
+            self.circuit_breaker.record_success()
+        self.mark_stale()  # datapoints skipped by their circuit breaker
 
-                # Store error information
-                dp_info = {
-                    "fp": fp,
-                    "dp": dp,
-                    "value": 0,
-                    "unit": "ERROR",
-                    "error_code": 1,
-                }
-                self.datapoint_values.append(dp_info)
-        print("Device read", self.datapoint_values)
+        if logger.isEnabledFor(logging.DEBUG):  # the values are only serialized for debug output
+            logger.debug("Device values: device=%s datapoints=%s", self.name, self.get_datapoint_values())
 
-        return self.datapoint_values
+        return self.snapshot
 
         # pass
 
+    def mark_stale(self, failed: bool = False):
+        """
+        Flags the values that were not read during the last read as stale with error code 1, e.g. after a read timeout.
+        :param failed: count the read as failure for the circuit breaker of the device
+        """
+        for index in self.pending_dps:
+            self.snapshot[index].stale = True
+            self.snapshot[index].error_code = 1
+            self.snapshot[index].fresh = True
+        self.pending_dps = set()
+        if failed:
+            self._record_read_failure(time.monotonic())
+
     def write_device_setpoint(self, functional_profile: str, setpoint: float):
         return 0  # error code
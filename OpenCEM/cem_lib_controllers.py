@@ -10,12 +10,15 @@ Version: 2.1, February 2026
 ---------------------------------------------------------------
 """
 
+import logging
 from OpenCEM.cem_lib_components import (
     Device,
     PowerSensor,
     HeatPump
 )  # TemperatureSensor, RelaisActuator, EVCharger
 
+logger = logging.getLogger(__name__)
+
 
 class Controller:
     # base class for controller
@@ -63,9 +66,11 @@ class SwitchingExcessController(Controller):
         self.mode = 0  # controller mode (0 = off, 1 = on, 2 = high, etc.)
         self.excess = 0  # actual pv excess in kW
 
-        print(
-            f"Controller created: {self.name} type {self.type} "
-            f"settings {controllerSettings}"
+        logger.info(
+            "Controller created: controller=%s type=%s settings=%s",
+            self.name,
+            self.type,
+            controllerSettings,
         )
 
     def set_controllerSettings(self, controllerSettings):
@@ -111,10 +116,13 @@ class SwitchingExcessController(Controller):
             remainingPower = 0
             ownConsumption = 0
 
-        print(
-            f"Controller calculated: {self.name} type {self.type} "
-            f"excess {self.excess:.2f} ownConsumption {ownConsumption:.2f} "
-            f"remainingPower {remainingPower:.2f}"
+        logger.debug(
+            "Controller calculated: controller=%s type=%s excess=%.2f ownConsumption=%.2f remainingPower=%.2f",
+            self.name,
+            self.type,
+            self.excess,
+            ownConsumption,
+            remainingPower,
         )
 
         old_mode = self.mode
@@ -159,9 +167,11 @@ class DynamicExcessController(SwitchingExcessController):
         self.type = "DYANMIC_EXCESS_CONTROLLER"  # type of controller
         self.power = 0
 
-        print(
-            f"Controller created: {self.name} type {self.type} "
-            f"settings {controllerSettings}"
+        logger.info(
+            "Controller created: controller=%s type=%s settings=%s",
+            self.name,
+            self.type,
+            controllerSettings,
         )
 
     async def calc_controller(self, remainingPower: float):
@@ -223,9 +233,11 @@ class TemperatureExcessController(SwitchingExcessController):
         self.tempSetpoint = self.tempEco  # starting value for temperature setpoint
         self.mode = 0  # OFF at initialisation
 
-        print(
-            f"Controller created: {self.name} type {self.type} "
-            f"settings {controllerSettings}"
+        logger.info(
+            "Controller created: controller=%s type=%s settings=%s",
+            self.name,
+            self.type,
+            controllerSettings,
         )
 
     def set_controllerSettings(self, controllerSettings):
@@ -262,9 +274,12 @@ class TemperatureExcessController(SwitchingExcessController):
         else:
             self.tempSetpoint = self.tempEco
 
-        print(
-            f"Temperature Controller calculated: {self.name} type {self.type} "
-            f"excess {self.excess:.2f} tempSetpoint {self.tempSetpoint:.2f}"
+        logger.debug(
+            "Temperature Controller calculated: controller=%s type=%s excess=%.2f tempSetpoint=%.2f",
+            self.name,
+            self.type,
+            self.excess,
+            self.tempSetpoint,
         )
 
         error_code = self.controlledDevice.write_device_setpoint(
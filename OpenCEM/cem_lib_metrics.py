@@ -0,0 +1,220 @@
+"""
+---------------------------------------------------------------
+cem_lib_metrics
+Library for OpenCEM
+Contains metrics for the calculation loop and the device reads
+---------------------------------------------------------------
+Fachhochschule Nordwestschweiz, Institut für Automation
+Authors: Prof. Dr. D. Zogg, S. Ferreira, Ch. Zeltner, M. Krebs
+Version: 2.1, February 2026
+---------------------------------------------------------------
+"""
+
+import collections
+import copy
+import threading
+
+window_size = 500  # number of samples kept per histogram
+quantiles = (0.5, 0.9, 0.99)
+
+
+class RollingHistogram:
+    # distribution of the last samples, e.g. read latencies in seconds
+    # count and sum are totals since the start, so Prometheus can use them as counters
+
+    def __init__(self, size: int = None):
+        self.samples = collections.deque(maxlen=size or window_size)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.samples.append(value)
+        self.count += 1
+        self.sum += value
+
+    def summary(self) -> dict:
+        # total count and sum, max and quantiles over the samples in the window
+        values = sorted(self.samples)
+        result = {"count": self.count, "sum": self.sum, "max": values[-1] if values else 0.0}
+        for quantile in quantiles:
+            result[quantile] = values[min(len(values) - 1, int(quantile * len(values)))] if values else 0.0
+        return result
+
+
+class MetricsRegistry:
+    """
+    Collects rolling histograms, counters and gauges with labels.
+    Metrics are identified by name and labels, e.g. observe("opencem_device_read_seconds", 0.1, device="meter").
+    The registry is shared by the calculation loop and the GUI, so it is protected by a lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.help = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted(labels.items()))
+
+    def describe(self, name: str, text: str):
+        self.help[name] = text
+
+    def observe(self, name: str, value: float, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = RollingHistogram()
+            histogram.observe(value)
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self.gauges[self._key(name, labels)] = value
+
+    def snapshot(self) -> dict:
+        """
+        Copies all metrics, e.g. to send them from a worker process to the main process.
+        :return: picklable dict of histograms, counters and gauges
+        """
+        with self._lock:
+            return {
+                "histograms": copy.deepcopy(self.histograms),
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+            }
+
+    def merge(self, snapshot: dict):
+        """
+        Takes over the metrics of a snapshot, metrics with the same name and labels are replaced.
+        :param snapshot: dict returned by snapshot()
+        """
+        with self._lock:
+            self.histograms.update(snapshot["histograms"])
+            self.counters.update(snapshot["counters"])
+            self.gauges.update(snapshot["gauges"])
+
+    def clear(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.gauges.clear()
+
+    def to_dict(self) -> dict:
+        """
+        Exports all metrics as dict, e.g. for publishing via MQTT.
+        :return: dict with lists of histograms, counters and gauges
+        """
+        with self._lock:
+            histograms = [(key, histogram.summary()) for key, histogram in self.histograms.items()]
+            counters = list(self.counters.items())
+            gauges = list(self.gauges.items())
+
+        def entry(key, **values):
+            return {"name": key[0], "labels": dict(key[1]), **values}
+
+        return {
+            "histograms": [
+                entry(
+                    key,
+                    count=summary["count"],
+                    sum=summary["sum"],
+                    max=summary["max"],
+                    quantiles={str(quantile): summary[quantile] for quantile in quantiles},
+                )
+                for key, summary in histograms
+            ],
+            "counters": [entry(key, value=value) for key, value in counters],
+            "gauges": [entry(key, value=value) for key, value in gauges],
+        }
+
+    def to_prometheus(self) -> str:
+        """
+        Exports all metrics in the Prometheus text format. Histograms are exported as summaries.
+        :return: text to be served by a /metrics endpoint
+        """
+        with self._lock:
+            histograms = sorted((key, histogram.summary()) for key, histogram in self.histograms.items())
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+
+        lines = []
+        last_name = None
+
+        def header(name: str, metric_type: str):
+            nonlocal last_name
+            if name != last_name:
+                if name in self.help:
+                    lines.append(f"# HELP {name} {self.help[name]}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                last_name = name
+
+        for (name, labels), summary in histograms:
+            header(name, "summary")
+            for quantile in quantiles:
+                lines.append(f"{name}{_labels(labels, quantile=quantile)} {summary[quantile]}")
+            lines.append(f"{name}_sum{_labels(labels)} {summary['sum']}")
+            lines.append(f"{name}_count{_labels(labels)} {summary['count']}")
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{_labels(labels)} {value}")
+        for (name, labels), value in gauges:
+            header(name, "gauge")
+            lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: tuple, **extra) -> str:
+    # format labels as {key="value",...}
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in items) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# metrics of this process, shared by the calculation loop, the device reads and the GUI
+metrics = MetricsRegistry()
+metrics.describe("opencem_device_read_seconds", "Duration of a device read in seconds")
+metrics.describe("opencem_datapoint_read_seconds", "Duration of a datapoint read in seconds")
+metrics.describe("opencem_datapoint_read_errors_total", "Failed datapoint reads")
+metrics.describe("opencem_device_read_timeouts_total", "Device reads that exceeded the read timeout")
+metrics.describe("opencem_device_disconnects_total", "Connected devices marked disconnected after repeated failed reads")
+metrics.describe("opencem_create_dict_seconds", "Duration of building the value snapshot in seconds")
+metrics.describe("opencem_publish_enqueue_seconds", "Duration of encoding and queueing the values for MQTT in seconds")
+metrics.describe("opencem_mqtt_publish_seconds", "Duration of handing a queued message to the MQTT client in seconds")
+metrics.describe("opencem_tick_seconds", "Duration of a calculation loop tick in seconds")
+metrics.describe("opencem_tick_lateness_seconds", "Delay of the tick behind its deadline in seconds")
+metrics.describe("opencem_tick_overruns_total", "Ticks that were not finished before the next deadline")
+metrics.describe("opencem_tick_missed_total", "Ticks dropped by the skip policy")
+metrics.describe("opencem_logger_queue_depth", "Snapshots waiting for the data logger")
+metrics.describe("opencem_logger_queue_dropped_total", "Snapshots dropped because the data logger fell behind")
+metrics.describe("opencem_influx_batch_points", "Points written to InfluxDB per request")
+metrics.describe("opencem_influx_flush_seconds", "Duration of an InfluxDB write request in seconds")
+metrics.describe("opencem_influx_write_errors_total", "Failed InfluxDB write requests")
+metrics.describe("opencem_influx_spool_points", "Points spooled on disk while InfluxDB is not available")
+metrics.describe("opencem_influx_spool_bytes", "Size of the spooled points in bytes")
+metrics.describe("opencem_influx_spool_evicted_total", "Spooled points evicted because the spool was full")
+metrics.describe("opencem_influx_spool_replayed_total", "Spooled points written after InfluxDB was back")
+metrics.describe("opencem_logger_process_alive", "1 if the logger worker process is running")
+metrics.describe("opencem_logger_process_starts_total", "Starts of the logger worker process")
+metrics.describe("opencem_logger_influx_available", "1 if the last InfluxDB write of the logger worker succeeded")
+metrics.describe("opencem_logger_snapshots", "Snapshots stored by the logger worker")
+metrics.describe("opencem_gui_influx_query_seconds", "Duration of the InfluxDB queries of the GUI in seconds")
+metrics.describe("opencem_gui_influx_query_errors_total", "Failed InfluxDB queries of the GUI")
+metrics.describe("opencem_gui_influx_clients_created_total", "InfluxDB clients created by the GUI pool")
+metrics.describe("opencem_gui_influx_clients_idle", "Idle InfluxDB clients in the GUI pool")
+metrics.describe("opencem_publish_queue_depth", "Messages waiting to be published via MQTT")
+metrics.describe("opencem_publish_dropped_total", "Messages dropped because the publish queue was full")
+metrics.describe("opencem_publish_coalesced_total", "Queued messages replaced by a newer message of the same topic")
+metrics.describe("opencem_publish_requeued_total", "Messages queued again because the MQTT connection was lost")
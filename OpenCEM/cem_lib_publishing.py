@@ -0,0 +1,430 @@
+"""
+---------------------------------------------------------------
+cem_lib_publishing
+Library for OpenCEM
+Contains classes for publishing the device values via MQTT
+---------------------------------------------------------------
+Fachhochschule Nordwestschweiz, Institut für Automation
+Authors: Prof. Dr. D. Zogg, S. Ferreira, Ch. Zeltner, M. Krebs
+Version: 2.1, February 2026
+---------------------------------------------------------------
+"""
+
+import asyncio
+import collections
+import datetime
+import json
+import logging
+import os
+import time
+import msgpack
+import paho.mqtt.client as mqtt
+from OpenCEM.cem_lib_metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# version 2: epoch millisecond timestamp 'timestamp_ms', JSON payloads also carry the formatted 'timestamp'
+PAYLOAD_VERSION = 2
+PAYLOAD_FORMATS = ("json", "msgpack")
+
+
+def encode_payload(value_dict: dict, payload_format: str = "json") -> bytes:
+    """
+    Encodes a message for MQTT.
+    JSON messages also carry the timestamp formatted as '%d/%m/%Y, %H:%M:%S' for older subscribers.
+    MessagePack messages are compact binary and only carry the epoch millisecond timestamp.
+    :param value_dict: message with key 'timestamp_ms'
+    :param payload_format: "json" or "msgpack"
+    :return: encoded message
+    """
+    if payload_format == "msgpack":
+        return msgpack.packb(value_dict)
+    timestamp = datetime.datetime.fromtimestamp(value_dict["timestamp_ms"] / 1000)
+    return json.dumps({**value_dict, "timestamp": timestamp.strftime("%d/%m/%Y, %H:%M:%S")}).encode()
+
+
+def decode_payload(payload: bytes) -> dict:
+    """
+    Decodes a message of encode_payload. The format is detected from the first byte:
+    JSON objects start with '{', MessagePack maps never do.
+    :param payload: received message
+    :return: decoded message, check the key 'version' for the timestamp format
+    """
+    if payload[:1] == b"{":
+        return json.loads(payload)
+    return msgpack.unpackb(payload)
+
+
+class DeltaFilter:
+    """
+    Selects the datapoints whose value moved beyond the deadband since they were last published.
+    A change is published if it exceeds the absolute deadband and the relative deadband (fraction of the
+    last published value). Changes of unit, error code or stale flag are always published.
+    Every keyframe_interval seconds the full snapshot is published as keyframe for late subscribers.
+    """
+
+    def __init__(
+        self,
+        deadband_abs: float = 0.0,
+        deadband_rel: float = 0.0,
+        keyframe_interval: float = 600,
+    ):
+        self.deadband_abs = deadband_abs
+        self.deadband_rel = deadband_rel
+        self.keyframe_interval = keyframe_interval
+        self.next_keyframe = None  # monotonic time
+        self.last_published = {}  # (device, fp, dp) -> last published datapoint dict
+
+    def force_keyframe(self):
+        # the next snapshot is published as keyframe, e.g. after a delta was lost
+        self.next_keyframe = None
+
+    def filter(self, value_dict: dict) -> dict:
+        """
+        Reduces a snapshot of create_dict to the changed datapoints.
+        :param value_dict: dict with keys 'timestamp_ms' and 'devices_list'
+        :return: keyframe with all datapoints or delta with the changed datapoints, marked by the key 'type'
+        """
+        now = time.monotonic()
+        if self.next_keyframe is None or now >= self.next_keyframe:
+            self.next_keyframe = now + self.keyframe_interval
+            for device in value_dict["devices_list"]:
+                for dp in device["datapoints"]:
+                    self.last_published[(device["name"], dp["fp"], dp["dp"])] = dp
+            return {**value_dict, "type": "keyframe"}
+
+        devices_list = []
+        for device in value_dict["devices_list"]:
+            changed = []
+            for dp in device["datapoints"]:
+                key = (device["name"], dp["fp"], dp["dp"])
+                if self._changed(self.last_published.get(key), dp):
+                    self.last_published[key] = dp
+                    changed.append(dp)
+            if changed:
+                devices_list.append({"name": device["name"], "datapoints": changed})
+
+        return {**value_dict, "type": "delta", "devices_list": devices_list}
+
+    def _changed(self, last: dict, dp: dict) -> bool:
+        if last is None:
+            return True
+        if (
+            last["unit"] != dp["unit"]
+            or last["error_code"] != dp["error_code"]
+            or last.get("stale") != dp.get("stale")
+        ):
+            return True
+        value, last_value = dp["value"], last["value"]
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not isinstance(last_value, (int, float)):
+            return value != last_value
+        deadband = max(self.deadband_abs, self.deadband_rel * abs(last_value))
+        return abs(value - last_value) > deadband if deadband > 0 else value != last_value
+
+
+class ValuePublisher:
+    """
+    Publishes the snapshots of the calculation loop via MQTT.
+    In delta mode only the datapoints that changed beyond the deadband are published (see DeltaFilter).
+    Topic layouts:
+    - "single": one message with all devices on the topic openCEM/value
+    - "tree": one retained message per datapoint on openCEM/<device>/<fp>/<dp>
+    - "both": single and tree
+    Messages are encoded as JSON (default) or MessagePack, see encode_payload.
+    """
+
+    TOPIC_LAYOUTS = ("single", "tree", "both")
+
+    def __init__(
+        self,
+        MQTT_client,
+        topic: str = "openCEM/value",
+        delta_filter: DeltaFilter = None,
+        topic_layout: str = "single",
+        tree_prefix: str = "openCEM",
+        payload_format: str = "json",
+    ):
+        if topic_layout not in self.TOPIC_LAYOUTS:
+            raise ValueError(f"Unknown topic layout '{topic_layout}', use one of {self.TOPIC_LAYOUTS}")
+        if payload_format not in PAYLOAD_FORMATS:
+            raise ValueError(f"Unknown payload format '{payload_format}', use one of {PAYLOAD_FORMATS}")
+        self.MQTT_client = MQTT_client
+        self.topic = topic
+        self.delta_filter = delta_filter
+        self.topic_layout = topic_layout
+        self.tree_prefix = tree_prefix
+        self.payload_format = payload_format
+        self.datapoint_topics = {}  # (device, fp, dp) -> topic
+
+    def message_dropped(self, topic: str, coalesced: bool = False):
+        """
+        Called by PublishQueue if a queued message was dropped or replaced by a newer one.
+        In delta mode the lost changes are only restored by a keyframe, so the next snapshot is a keyframe.
+        A coalesced datapoint topic of the tree layout is replaced by the newer value of the same datapoint.
+        :param topic: topic of the dropped message
+        :param coalesced: True if it was replaced by a newer message of the same topic
+        """
+        if self.delta_filter is None or (coalesced and topic != self.topic):
+            return
+        if self.delta_filter.next_keyframe is not None:
+            logger.info("Delta message dropped, next snapshot is a keyframe: topic=%s", topic)
+        self.delta_filter.force_keyframe()
+
+    def publish(self, value_dict: dict):
+        """
+        Publishes a snapshot.
+        :param value_dict: dict of create_dict
+        """
+        if self.delta_filter is not None:
+            value_dict = self.delta_filter.filter(value_dict)
+            if not value_dict["devices_list"]:
+                logger.debug("Nothing changed, delta not published")
+                return
+        if self.topic_layout in ("single", "both"):
+            self.MQTT_client.publish(self.topic, encode_payload(value_dict, self.payload_format))
+        if self.topic_layout in ("tree", "both"):
+            self.publish_tree(value_dict)
+
+    def publish_tree(self, value_dict: dict):
+        # one small retained message per datapoint, new subscribers get the last values immediately
+        timestamp_ms = value_dict["timestamp_ms"]
+        for device in value_dict["devices_list"]:
+            for dp in device["datapoints"]:
+                payload = {
+                    "version": PAYLOAD_VERSION,
+                    "timestamp_ms": timestamp_ms,
+                    "value": dp["value"],
+                    "unit": dp["unit"],
+                    "error_code": dp["error_code"],
+                    "stale": dp.get("stale", False),
+                }
+                self.MQTT_client.publish(
+                    self.datapoint_topic(device["name"], dp["fp"], dp["dp"]),
+                    encode_payload(payload, self.payload_format),
+                    retain=True,
+                )
+
+    def datapoint_topic(self, device_name: str, functional_profile: str, data_point: str) -> str:
+        key = (device_name, functional_profile, data_point)
+        topic = self.datapoint_topics.get(key)
+        if topic is None:
+            topic = "/".join([self.tree_prefix] + [_topic_level(name) for name in key])
+            self.datapoint_topics[key] = topic
+        return topic
+
+
+class PublishQueue:
+    """
+    Bounded queue between the calculation loop and the MQTT client, owned by the asyncio loop.
+    publish() has the signature of the paho client, so it can be passed to ValuePublisher and metrics_loop.
+    The task run() sends the messages in order while the broker is connected and keeps them while it is not.
+    Overflow policies if the queue is full:
+    - "drop_oldest": the oldest message is dropped
+    - "coalesce": a queued message with the same topic is replaced, otherwise the oldest message is dropped
+    - "spill": new messages are appended to a journal file on disk and replayed after the queue,
+      the oldest messages of the journal are dropped if it exceeds journal_max_bytes
+    Messages that paho lost because the connection dropped are queued again.
+    on_drop(topic, coalesced) is called for every dropped or coalesced message, see ValuePublisher.message_dropped.
+    """
+
+    POLICIES = ("drop_oldest", "coalesce", "spill")
+
+    def __init__(
+        self,
+        MQTT_client,
+        maxsize: int = 1000,
+        policy: str = "drop_oldest",
+        journal_path: str = None,
+        max_inflight: int = 100,
+        retry_interval: float = 1.0,
+        journal_max_bytes: int = 100 * 1024 * 1024,
+    ):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown publish queue policy '{policy}', use one of {self.POLICIES}")
+        if policy == "spill" and not journal_path:
+            raise ValueError("The spill policy requires a journal path")
+        self.MQTT_client = MQTT_client
+        self.maxsize = max(1, maxsize)
+        self.policy = policy
+        self.journal_path = journal_path
+        self.max_inflight = max(1, max_inflight)
+        self.retry_interval = retry_interval
+        self.journal_max_bytes = max(1, journal_max_bytes)
+
+        self.queue = collections.deque()  # (topic, payload, retain)
+        self.inflight = collections.deque()  # (MQTTMessageInfo, message) of messages handed to paho
+        self.journal_count = 0  # messages in the journal that were not replayed yet
+        self.journal_offset = 0  # read position in the journal
+        self.journal_size = 0  # size of the journal file in bytes
+        self.dropped = 0
+        self.on_drop = None
+        self._wakeup = asyncio.Event()
+
+        if policy == "spill":
+            # replay the messages left from the last run
+            for _ in self._read_journal(0):
+                self.journal_count += 1
+            if self.journal_count:
+                self.journal_size = os.path.getsize(self.journal_path)
+        self._update_depth()
+
+    def publish(self, topic: str, payload, retain: bool = False):
+        """
+        Queues a message, does not block.
+        :param topic: MQTT topic
+        :param payload: str or bytes
+        :param retain: retain flag of the message
+        """
+        message = (topic, payload, retain)
+        if self.journal_count:
+            # older messages are on disk, append behind them to keep the order
+            self._append_journal(message)
+        elif len(self.queue) < self.maxsize:
+            self.queue.append(message)
+        elif self.policy == "spill":
+            self._append_journal(message)
+        elif not (self.policy == "coalesce" and self._replace(message)):
+            self._notify_drop(self.queue.popleft()[0])
+            self.queue.append(message)
+            self.dropped += 1
+            metrics.increment("opencem_publish_dropped_total", policy=self.policy)
+        self._update_depth()
+        self._wakeup.set()
+
+    def __len__(self):
+        return len(self.queue) + self.journal_count
+
+    async def run(self):
+        """
+        Sends the queued messages in order. Runs until cancelled.
+        """
+        while True:
+            if not self.queue and self.journal_count:
+                self._refill()
+            if not self.queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            if not self.MQTT_client.is_connected():
+                # keep the messages until the broker is back
+                await asyncio.sleep(self.retry_interval)
+                continue
+
+            # limit the messages in the internal queue of paho
+            self._check_inflight()
+            if len(self.inflight) >= self.max_inflight:
+                await asyncio.sleep(0.01)
+                continue
+
+            topic, payload, retain = self.queue[0]
+            start = time.perf_counter()
+            info = self.MQTT_client.publish(topic, payload, retain=retain)
+            metrics.observe("opencem_mqtt_publish_seconds", time.perf_counter() - start)
+            if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                logger.warning("MQTT publish failed, retrying: topic=%s rc=%s", topic, info.rc)
+                await asyncio.sleep(self.retry_interval)
+                continue
+            self.inflight.append((info, self.queue.popleft()))
+            self._update_depth()
+            await asyncio.sleep(0)  # let the calculation loop run between messages
+
+    def _check_inflight(self):
+        # remove the sent messages, queue the messages lost with the connection again in their order
+        pending = collections.deque()
+        lost = []
+        for info, message in self.inflight:
+            if info.rc not in (mqtt.MQTT_ERR_SUCCESS, mqtt.MQTT_ERR_AGAIN):
+                lost.append(message)
+            elif not info.is_published():
+                pending.append((info, message))
+        self.inflight = pending
+        if lost:
+            logger.warning("MQTT messages lost with the connection, queued again: count=%d", len(lost))
+            metrics.increment("opencem_publish_requeued_total", len(lost))
+            self.queue.extendleft(reversed(lost))
+            self._update_depth()
+
+    def _replace(self, message: tuple) -> bool:
+        # replace the queued message with the same topic, the new message moves to the end
+        for i, (topic, _, _) in enumerate(self.queue):
+            if topic == message[0]:
+                del self.queue[i]
+                self.queue.append(message)
+                metrics.increment("opencem_publish_coalesced_total")
+                self._notify_drop(topic, coalesced=True)
+                return True
+        return False
+
+    def _notify_drop(self, topic: str, coalesced: bool = False):
+        if self.on_drop is not None:
+            self.on_drop(topic, coalesced)
+
+    def _append_journal(self, message: tuple):
+        with open(self.journal_path, "ab") as f:
+            f.write(msgpack.packb(list(message)))
+            self.journal_size = f.tell()
+        self.journal_count += 1
+        if self.journal_size > self.journal_max_bytes:
+            self._trim_journal()
+
+    def _trim_journal(self):
+        # drop the oldest messages until the journal is below 90 % of its maximum, so it is not rewritten every message
+        cutoff = self.journal_size - int(self.journal_max_bytes * 0.9)
+        start = self.journal_offset
+        dropped = 0
+        for message, offset in self._read_journal(self.journal_offset):
+            if start >= cutoff:
+                break
+            start = offset
+            dropped += 1
+            self._notify_drop(message[0])
+        with open(self.journal_path, "rb") as f:
+            f.seek(start)
+            rest = f.read()
+        with open(self.journal_path + ".tmp", "wb") as f:
+            f.write(rest)
+        os.replace(self.journal_path + ".tmp", self.journal_path)
+        self.journal_offset = 0
+        self.journal_size = len(rest)
+        self.journal_count -= dropped
+        self.dropped += dropped
+        metrics.increment("opencem_publish_dropped_total", dropped, policy=self.policy)
+        logger.warning("Publish journal full, oldest messages dropped: count=%d", dropped)
+
+    def _read_journal(self, offset: int):
+        # yields (message, offset after the message)
+        if not self.journal_path or not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, "rb") as f:
+            f.seek(offset)
+            unpacker = msgpack.Unpacker(f)
+            try:
+                for message in unpacker:
+                    yield tuple(message), offset + unpacker.tell()
+            except ValueError as e:
+                logger.error("Publish journal damaged, rest is ignored: path=%s error=%s", self.journal_path, e)
+
+    def _refill(self):
+        # move the next messages from the journal to the queue, delete the journal when it is replayed
+        for message, offset in self._read_journal(self.journal_offset):
+            self.queue.append(message)
+            self.journal_offset = offset
+            self.journal_count -= 1
+            if len(self.queue) >= self.maxsize:
+                break
+        if self.journal_count <= 0 or not self.queue:
+            self.journal_count = 0
+            self.journal_offset = 0
+            self.journal_size = 0
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+        self._update_depth()
+
+    def _update_depth(self):
+        metrics.set_gauge("opencem_publish_queue_depth", len(self.queue), storage="memory")
+        metrics.set_gauge("opencem_publish_queue_depth", self.journal_count, storage="journal")
+
+
+def _topic_level(name: str) -> str:
+    # MQTT wildcards and level separators are not allowed within a topic level
+    return str(name).replace("/", "_").replace("+", "_").replace("#", "_")
@@ -17,10 +17,12 @@ import OpenCEM.cem_lib_components
 import yaml
 import os
 import paho.mqtt.client as mqtt
-from OpenCEM.cem_lib_auxiliary_functions import parse_yaml, calculation_loop
+from OpenCEM.cem_lib_auxiliary_functions import parse_yaml, calculation_loop, metrics_loop, setup_logging
+from OpenCEM.cem_lib_publishing import DeltaFilter, PublishQueue, ValuePublisher
 import config_helper
 
-from Data_Logger import InfluxDataLogger
+from Data_Logger import InfluxDataLogger, InfluxSchema, LoggerProcess
+import queue
 import threading
 
 # Load configuration from YAML file
@@ -40,6 +42,42 @@ influxDB_user = config_helper.get_setting('INFLUX_USER', 'influxDB_user', settin
 influxDB_password = config_helper.get_setting('INFLUX_PASSWORD', 'influxDB_password', settings=config, default_value='')
 loop_time = int(config_helper.get_setting('LOOP_TIME', 'loop_time', settings=config, default_value=60))
 simulation_speed = float(config_helper.get_setting('SIMULATION_SPEED', 'simulation_speed', settings=config, default_value=1.0))
+concurrent_polling = config_helper.to_bool(config_helper.get_setting('CONCURRENT_POLLING', 'concurrent_polling', settings=config, default_value=False))
+max_concurrent_reads = int(config_helper.get_setting('MAX_CONCURRENT_READS', 'max_concurrent_reads', settings=config, default_value=4))
+read_timeout = float(config_helper.get_setting('READ_TIMEOUT', 'read_timeout', settings=config, default_value=0))
+max_concurrent_connects = int(config_helper.get_setting('MAX_CONCURRENT_CONNECTS', 'max_concurrent_connects', settings=config, default_value=4))
+connect_timeout = float(config_helper.get_setting('CONNECT_TIMEOUT', 'connect_timeout', settings=config, default_value=30))
+breaker_failure_threshold = int(config_helper.get_setting('BREAKER_FAILURE_THRESHOLD', 'breaker_failure_threshold', settings=config, default_value=3))
+breaker_backoff_min = float(config_helper.get_setting('BREAKER_BACKOFF_MIN', 'breaker_backoff_min', settings=config, default_value=10))
+breaker_backoff_max = float(config_helper.get_setting('BREAKER_BACKOFF_MAX', 'breaker_backoff_max', settings=config, default_value=600))
+tick_policy = config_helper.get_setting('TICK_POLICY', 'tick_policy', settings=config, default_value='skip')
+topic_layout = config_helper.get_setting('TOPIC_LAYOUT', 'topic_layout', settings=config, default_value='single')
+payload_format = config_helper.get_setting('PAYLOAD_FORMAT', 'payload_format', settings=config, default_value='json')
+publish_queue_size = int(config_helper.get_setting('PUBLISH_QUEUE_SIZE', 'publish_queue_size', settings=config, default_value=1000))
+publish_queue_policy = config_helper.get_setting('PUBLISH_QUEUE_POLICY', 'publish_queue_policy', settings=config, default_value='drop_oldest')
+publish_journal_path = config_helper.get_setting('PUBLISH_JOURNAL_PATH', 'publish_journal_path', settings=config, default_value=os.path.join(config_path, 'publish_journal.msgpack'))
+publish_journal_max_mb = float(config_helper.get_setting('PUBLISH_JOURNAL_MAX_MB', 'publish_journal_max_mb', settings=config, default_value=100))
+influx_schema = config_helper.get_setting('INFLUX_SCHEMA', 'influx_schema', settings=config, default_value='per_device')
+influx_database = config_helper.get_setting('INFLUX_DATABASE', 'influx_database', settings=config, default_value='openCEM')
+influx_timestamps = config_helper.get_setting('INFLUX_TIMESTAMPS', 'influx_timestamps', settings=config, default_value='local')
+influx_batch_size = int(config_helper.get_setting('INFLUX_BATCH_SIZE', 'influx_batch_size', settings=config, default_value=5000))
+influx_flush_interval = float(config_helper.get_setting('INFLUX_FLUSH_INTERVAL', 'influx_flush_interval', settings=config, default_value=10))
+influx_spool_path = config_helper.get_setting('INFLUX_SPOOL_PATH', 'influx_spool_path', settings=config, default_value=os.path.join(config_path, 'influx_spool.sqlite'))
+influx_spool_max_mb = float(config_helper.get_setting('INFLUX_SPOOL_MAX_MB', 'influx_spool_max_mb', settings=config, default_value=100))
+influx_replay_rate = float(config_helper.get_setting('INFLUX_REPLAY_RATE', 'influx_replay_rate', settings=config, default_value=5000))
+influx_write_timeout = float(config_helper.get_setting('INFLUX_WRITE_TIMEOUT', 'influx_write_timeout', settings=config, default_value=10))
+logger_mode = config_helper.get_setting('LOGGER_MODE', 'logger_mode', settings=config, default_value='thread')
+logger_health_interval = float(config_helper.get_setting('LOGGER_HEALTH_INTERVAL', 'logger_health_interval', settings=config, default_value=10))
+logger_queue_size = int(config_helper.get_setting('LOGGER_QUEUE_SIZE', 'logger_queue_size', settings=config, default_value=100))
+publish_mode = config_helper.get_setting('PUBLISH_MODE', 'publish_mode', settings=config, default_value='full')
+deadband_abs = float(config_helper.get_setting('DEADBAND_ABS', 'deadband_abs', settings=config, default_value=0.0))
+deadband_rel = float(config_helper.get_setting('DEADBAND_REL', 'deadband_rel', settings=config, default_value=0.0))
+keyframe_interval = float(config_helper.get_setting('KEYFRAME_INTERVAL', 'keyframe_interval', settings=config, default_value=600))
+metrics_interval = float(config_helper.get_setting('METRICS_INTERVAL', 'metrics_interval', settings=config, default_value=60))
+log_level = config_helper.get_setting('LOG_LEVEL', 'log_level', settings=config, default_value='INFO')
+
+setup_logging(log_level)
+logger = logging.getLogger(__name__)
 
 
 async def main():
@@ -47,69 +85,180 @@ async def main():
     global mqtt_address, mqtt_port
     global influxDB_address, influxDB_port, influxDB_user, influxDB_password
     global loop_time, simulation_speed
+    global concurrent_polling, max_concurrent_reads, read_timeout, tick_policy
+    global max_concurrent_connects, connect_timeout
+    global breaker_failure_threshold, breaker_backoff_min, breaker_backoff_max
+    global metrics_interval
+    global publish_mode, deadband_abs, deadband_rel, keyframe_interval, topic_layout, payload_format
+    global publish_queue_size, publish_queue_policy, publish_journal_path, publish_journal_max_mb, logger_queue_size
+    global influx_schema, influx_database, influx_timestamps, influx_batch_size, influx_flush_interval
+    global influx_spool_path, influx_spool_max_mb, influx_replay_rate, influx_write_timeout
+    global logger_mode, logger_health_interval
+    devices_list = []
+    task_calculation_loop = None
+    task_metrics_loop = None
+    task_publish_queue = None
+    mqtt_client = None
+    logger_thread = None
+    influx_logger = None
+    logger_process = None
+    task_logger_monitor = None
     try:
         # set variables for the library
         OpenCEM.cem_lib_components.simulation_speed_up_factor = simulation_speed
+        OpenCEM.cem_lib_components.breaker_failure_threshold = breaker_failure_threshold
+        OpenCEM.cem_lib_components.breaker_backoff_min = breaker_backoff_min
+        OpenCEM.cem_lib_components.breaker_backoff_max = breaker_backoff_max
 
         # parse yaml
-        devices_list = await parse_yaml(os.path.join(config_path, "config.yaml"))
+        devices_list = await parse_yaml(
+            os.path.join(config_path, "config.yaml"),
+            default_interval=loop_time,
+            max_concurrent_connects=max_concurrent_connects,
+            connect_timeout=connect_timeout,
+        )
 
-        # start MQTT client
+        # start MQTT client, reconnects in the background if the broker is not reachable
         mqtt_client = mqtt.Client()
-        mqtt_client.connect(mqtt_address, mqtt_port)
+        mqtt_client.connect_async(mqtt_address, mqtt_port)
         mqtt_client.loop_start()
 
-        # start InfluxDB logger
-        influx_logger = InfluxDataLogger(
+        # messages are queued while the broker is not connected
+        publish_queue = PublishQueue(
+            mqtt_client,
+            maxsize=publish_queue_size,
+            policy=publish_queue_policy,
+            journal_path=publish_journal_path,
+            journal_max_bytes=int(publish_journal_max_mb * 1024 * 1024),
+        )
+        task_publish_queue = asyncio.create_task(publish_queue.run())
+
+        # publish the values, in delta mode only changed values and periodic keyframes
+        delta_filter = None
+        if publish_mode == "delta":
+            delta_filter = DeltaFilter(deadband_abs, deadband_rel, keyframe_interval)
+        value_publisher = ValuePublisher(
+            publish_queue,
+            "openCEM/value",
+            delta_filter,
+            topic_layout=topic_layout,
+            payload_format=payload_format,
+        )
+        # in delta mode a dropped message is restored by a keyframe
+        publish_queue.on_drop = value_publisher.message_dropped
+
+        # start InfluxDB logger, receives the snapshots directly from the calculation loop
+        logger_kwargs = dict(
             influx_host=influxDB_address,
             influx_port=influxDB_port,
             influx_user=influxDB_user,
             influx_password=influxDB_password,
-            mqtt_broker=mqtt_address,
-            mqtt_port=mqtt_port,
-            mqtt_topic="openCEM/value",
+            batch_size=influx_batch_size,
+            flush_interval=influx_flush_interval,
+            schema=InfluxSchema(influx_schema, influx_database, timestamps=influx_timestamps),
+            spool_path=influx_spool_path,
+            spool_max_bytes=int(influx_spool_max_mb * 1024 * 1024),
+            replay_rate=influx_replay_rate,
+            influx_timeout=influx_write_timeout,
         )
-        # start logger thread
-        logger_thread = threading.Thread(target=influx_logger.start_logging)
-        logger_thread.daemon = True
-        logger_thread.start()
-        print("InfluxDB logger thread started")
+        if logger_mode == "process":
+            # own process, InfluxDB requests do not share the GIL with the calculation loop
+            logger_process = LoggerProcess(logger_kwargs, logger_queue_size, logger_health_interval, log_level)
+            logger_process.start()
+            if await logger_process.wait_ready():
+                snapshot_queue = logger_process.snapshot_queue
+                task_logger_monitor = asyncio.create_task(logger_process.monitor())
+                logger.info("InfluxDB logger process started")
+            else:
+                logger.error("InfluxDB logger process failed to start, using the logger thread")
+                await logger_process.stop()
+                logger_process = None
+        if logger_process is None:
+            snapshot_queue = queue.Queue(maxsize=max(1, logger_queue_size))
+            influx_logger = InfluxDataLogger(snapshot_queue=snapshot_queue, **logger_kwargs)
+            # start logger thread
+            logger_thread = threading.Thread(target=influx_logger.start_logging)
+            logger_thread.daemon = True
+            logger_thread.start()
+            logger.info("InfluxDB logger thread started")
 
         # start calculation loop
         task_calculation_loop = asyncio.create_task(
-            calculation_loop(devices_list, loop_time, mqtt_client)
+            calculation_loop(
+                devices_list,
+                loop_time,
+                value_publisher,
+                concurrent_polling=concurrent_polling,
+                max_concurrent_reads=max_concurrent_reads,
+                read_timeout=read_timeout,
+                tick_policy=tick_policy,
+                snapshot_queue=snapshot_queue,
+            )
         )
 
-        await task_calculation_loop
+        # publish metrics periodically
+        if metrics_interval > 0:
+            task_metrics_loop = asyncio.create_task(
+                metrics_loop(publish_queue, metrics_interval)
+            )
+
+        # restart the publish queue if it fails, the queued messages are kept
+        while True:
+            await asyncio.wait({task_calculation_loop, task_publish_queue}, return_when=asyncio.FIRST_COMPLETED)
+            if task_calculation_loop.done():
+                await task_calculation_loop
+                break
+            logger.error("Publish queue stopped, restarting: %r", task_publish_queue.exception())
+            await asyncio.sleep(publish_queue.retry_interval)
+            task_publish_queue = asyncio.create_task(publish_queue.run())
 
     except Exception as e:
-        print(f"OpenCEM error: {e}")
-        logging.error(f"OpenCEM error: {e}")
+        logger.error("OpenCEM error: %s", e)
     finally:
+        # Stop metrics loop
+        if task_metrics_loop and not task_metrics_loop.done():
+            task_metrics_loop.cancel()
+
+        # Stop publish queue, messages in the journal are replayed on the next start
+        if task_publish_queue and not task_publish_queue.done():
+            task_publish_queue.cancel()
+
         # Stop calculation loop
         if task_calculation_loop and not task_calculation_loop.done():
-            print("  Stopping calculation loop...")
+            logger.info("Stopping calculation loop...")
             task_calculation_loop.cancel()
             try:
                 await task_calculation_loop
             except asyncio.CancelledError:
-                print(" Calculation loop stopped")
+                logger.info("Calculation loop stopped")
+
+        # Stop background reconnects of the devices
+        for device in devices_list:
+            device.stop_reconnect()
 
         # Stop MQTT client
         if mqtt_client:
-            print("Stopping MQTT client")
+            logger.info("Stopping MQTT client")
             try:
                 mqtt_client.loop_stop()
                 mqtt_client.disconnect()
-                print("MQTT client stopped")
+                logger.info("MQTT client stopped")
             except Exception as e:
-                print(f"MQTT stop error: {e}")
+                logger.error("MQTT stop error: %s", e)
+
+        # Stop logger process, the remaining points are written or spooled
+        if task_logger_monitor and not task_logger_monitor.done():
+            task_logger_monitor.cancel()
+        if logger_process:
+            await logger_process.stop()
 
-        # Wait for logger thread
+        # Stop logger thread
+        if influx_logger:
+            influx_logger.stop_logging()
         if logger_thread and logger_thread.is_alive():
             logger_thread.join(timeout=3)
 
-        print("OpenCEM cleanup completed")
+        logger.info("OpenCEM cleanup completed")
 
 
 if __name__ == "__main__":
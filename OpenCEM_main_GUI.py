@@ -1,9 +1,11 @@
-from nicegui import ui
+from nicegui import app, ui
+from fastapi.responses import PlainTextResponse
 import yaml
 import GUI_functions
 import os
 
 import config_helper
+from OpenCEM.cem_lib_metrics import metrics
 
 
 def trigger_indicator():
@@ -16,6 +18,12 @@ def trigger_indicator():
         status_label.text = "Live plots: OFF"
 
 
+@app.get("/metrics")
+def get_metrics():
+    # metrics of the calculation loop in the Prometheus text format
+    return PlainTextResponse(metrics.to_prometheus(), media_type="text/plain; version=0.0.4")
+
+
 # Main navigation tabs
 with ui.tabs().classes("w-full") as tabs:
     config_tab = ui.tab("config", label="Configuration")
@@ -21,3 +21,14 @@ def get_setting(env_name, setting_name, settings={}, default_value=None):
         return env_val if env_val != '' else setting_val
     # neither are defined
     return default_value
+
+
+def to_bool(value) -> bool:
+    """
+    Converts a setting value to a boolean. Environment variables are strings, e.g. 'true', '1', 'yes'.
+
+    :param value: the setting value
+    """
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
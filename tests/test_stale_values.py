@@ -0,0 +1,20 @@
+import asyncio
+
+from Data_Logger import InfluxSchema
+from OpenCEM.cem_lib_components import Device, serialize_snapshot
+
+
+def test_disconnected_device_does_not_log_good_value():
+    device = Device(name="meter", dp_list=[{"fp": "ActivePowerAC", "dp": "ActivePowerACtot"}], interval=1)
+    device.schedule_reconnect = lambda: None  # no background connect in the test
+    device.snapshot[0].update(5.0, "KILOWATT", 0)
+
+    # the device went offline, the last value is served as stale
+    device.connected = False
+    asyncio.run(device.read())
+
+    dp = serialize_snapshot(device.snapshot)[0]
+    assert dp["stale"] is True
+    assert dp["error_code"] == 1
+    line = InfluxSchema("tagged").make_line("meter", dp, 1700000000000)
+    assert line is None or "error_code=1i" in line